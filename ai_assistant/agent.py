@@ -1,7 +1,10 @@
 from llama_index.core import PromptTemplate
 from llama_index.core.agent import ReActAgent
+from llama_index.core.memory import BaseMemory
+from ai_assistant.config import get_agent_settings
+from ai_assistant.rags import get_llm
 from ai_assistant.tools import (
-    travel_guide_tool,
+    get_travel_guide_tool,
     flight_tool,
     hotel_tool,
     bus_tool,
@@ -9,19 +12,27 @@ from ai_assistant.tools import (
     trip_summary_tool
 )
 
+SETTINGS = get_agent_settings()
+
 
 class TravelAgent:
-    def __init__(self, system_prompt: PromptTemplate | None = None):
+    def __init__(
+        self,
+        system_prompt: PromptTemplate | None = None,
+        memory: BaseMemory | None = None,
+    ):
         self.agent = ReActAgent.from_tools(
             [
-                travel_guide_tool,
+                get_travel_guide_tool(),
                 flight_tool,
                 hotel_tool,
                 bus_tool,
                 restaurant_tool,
                 trip_summary_tool
             ],
-            verbose=True,
+            llm=get_llm(),
+            memory=memory,
+            verbose=SETTINGS.agent_verbose,
         )
         if system_prompt is not None:
             self.agent.update_prompts({"agent_worker:system_prompt": system_prompt})
@@ -0,0 +1,132 @@
+import os
+import argparse
+import numpy as np
+
+CENTROIDS_FNAME = "ivf_centroids.npy"
+ORDER_FNAME = "ivf_order.npy"
+OFFSETS_FNAME = "ivf_offsets.npy"
+
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(matrix[start : start + ASSIGN_CHUNK_ROWS])
+        assignments[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(
+    matrix: np.ndarray,
+    nlist: int,
+    iterations: int = 10,
+    sample_per_list: int = 64,
+    seed: int = 0,
+) -> np.ndarray:
+    """Spherical k-means over (a sample of) the L2-normalised rows."""
+    rng = np.random.default_rng(seed)
+    n_rows = len(matrix)
+    sample_size = min(n_rows, nlist * sample_per_list)
+    sample = np.asarray(matrix[np.sort(rng.choice(n_rows, sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+        empty = counts == 0
+        # Re-seed empty lists with random points so every list stays useful.
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file index: rows are bucketed by their nearest k-means centroid.
+
+    A query scores the centroids, then only the rows of the nprobe closest
+    buckets, instead of the whole matrix.
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.order)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int = 0, seed: int = 0) -> "IVFIndex":
+        n_rows = len(matrix)
+        if nlist <= 0:
+            nlist = max(1, int(np.sqrt(n_rows)))
+        nlist = min(nlist, n_rows)
+        centroids = train_centroids(matrix, nlist, seed=seed)
+        assignments = _assign(matrix, centroids)
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+        return cls(centroids, order, offsets)
+
+    def candidate_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate(
+            [self.order[self.offsets[probe] : self.offsets[probe + 1]] for probe in probes]
+        )
+
+    def save(self, persist_dir: str) -> None:
+        for fname, array in (
+            (CENTROIDS_FNAME, self.centroids),
+            (ORDER_FNAME, self.order),
+            (OFFSETS_FNAME, self.offsets),
+        ):
+            tmp_path = os.path.join(persist_dir, f"{fname}.tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(persist_dir, fname))
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, CENTROIDS_FNAME))
+
+    @classmethod
+    def remove(cls, persist_dir: str) -> None:
+        for fname in (CENTROIDS_FNAME, ORDER_FNAME, OFFSETS_FNAME):
+            path = os.path.join(persist_dir, fname)
+            if os.path.exists(path):
+                os.remove(path)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "IVFIndex":
+        return cls(
+            np.load(os.path.join(persist_dir, CENTROIDS_FNAME)),
+            np.load(os.path.join(persist_dir, ORDER_FNAME), mmap_mode="r"),
+            np.load(os.path.join(persist_dir, OFFSETS_FNAME)),
+        )
+
+
+if __name__ == "__main__":
+    from ai_assistant.vector_stores import MemmapVectorStore
+
+    parser = argparse.ArgumentParser(
+        description="Build the IVF index for a memmap travel guide store"
+    )
+    parser.add_argument("store_path")
+    parser.add_argument("--nlist", type=int, default=0)
+    args = parser.parse_args()
+    store = MemmapVectorStore.from_persist_dir(args.store_path)
+    index = store.build_ann_index(args.nlist)
+    index.save(args.store_path)
+    print(f"built IVF index with {index.nlist} lists over {index.n_rows} rows")
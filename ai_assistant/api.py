@@ -1,23 +1,201 @@
-from fastapi import FastAPI, Depends, Query, HTTPException
+import asyncio
+from contextlib import asynccontextmanager, AsyncExitStack
+from typing import Annotated, AsyncIterator
+from fastapi import FastAPI, Query, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from llama_index.core.agent import ReActAgent
 from ai_assistant.agent import TravelAgent
-from ai_assistant.models import AgentAPIResponse, ReservationAPIResponse
+from ai_assistant.cache import ResponseCache
+from ai_assistant.metrics import (
+    CONTENT_TYPE,
+    REGISTRY,
+    TRIP_REPORTS,
+    TracingMiddleware,
+    recent_traces,
+)
+from ai_assistant.config import get_agent_settings
+from ai_assistant.models import (
+    AgentAPIResponse,
+    AgentPoolStats,
+    BatchReservationItem,
+    BatchReservationRequest,
+    BatchReservationResponse,
+    BusBooking,
+    FlightBooking,
+    HotelBooking,
+    ConcurrencyStats,
+    EmbeddingCacheStats,
+    ReadinessStatus,
+    RequestTrace,
+    ReservationAPIResponse,
+    ResponseCacheStats,
+    RestaurantBooking,
+)
+from ai_assistant.pool import (
+    AgentPool,
+    AgentPoolTimeout,
+    ConcurrencyLimiter,
+    ConcurrencyLimitTimeout,
+)
 from ai_assistant.prompts import agent_prompt_tpl
+from ai_assistant.report import (
+    TripReportCache,
+    direct_trip_report,
+    etag_matches,
+    make_etag,
+    stream_direct_trip_report,
+)
+from ai_assistant.rags import (
+    embed_query,
+    get_embed_model,
+    get_llm,
+    is_embed_model_loaded,
+)
+from ai_assistant.streaming import sse_event, stream_agent_events
+from ai_assistant.trips import TRIP_ID_PATTERN, trip_scope
 from ai_assistant.tools import (
+    build_bus_reservation,
+    build_flight_reservation,
+    build_hotel_reservation,
+    build_restaurant_reservation,
+    get_travel_guide_tool,
     reserve_bus,
     reserve_flight,
     reserve_hotel,
     reserve_restaurant,
 )
+from ai_assistant.utils import load_reservations, save_reservations, trip_log_version
+from ai_assistant.warmup import Warmup
 
 from datetime import date, time, datetime
 
 
-def get_agent() -> ReActAgent:
+SETTINGS = get_agent_settings()
+
+TripId = Annotated[
+    str | None,
+    Query(
+        pattern=TRIP_ID_PATTERN,
+        description="Trip (or traveller) the reservations belong to; without one the shared log is used",
+    ),
+]
+
+
+def build_agent() -> ReActAgent:
     return TravelAgent(system_prompt=agent_prompt_tpl).get_agent()
 
 
-app = FastAPI(title="AI Agent")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    app.state.agent_pool = AgentPool(
+        factory=build_agent,
+        size=SETTINGS.agent_pool_size,
+        max_size=SETTINGS.agent_pool_max_size,
+        timeout=SETTINGS.agent_pool_timeout,
+    )
+    app.state.concurrency_limiter = ConcurrencyLimiter(
+        limit=SETTINGS.api_max_concurrency,
+        queue_timeout=SETTINGS.api_queue_timeout,
+    )
+    app.state.response_cache = ResponseCache(
+        embed_fn=embed_query
+        if SETTINGS.response_cache_semantic
+        else None,
+        similarity_threshold=SETTINGS.response_cache_similarity,
+        ttl=SETTINGS.response_cache_ttl,
+        max_size=SETTINGS.response_cache_max_size,
+        persist_path=SETTINGS.response_cache_path,
+    )
+    app.state.response_cache.load()
+    app.state.trip_report_cache = TripReportCache(max_size=SETTINGS.trip_report_cache_size)
+    # Models and the travel guide index load in the background, so the API
+    # (and the reservation endpoints, which never need them) serve at once.
+    steps = []
+    if SETTINGS.api_warmup:
+        steps = [
+            ("llm", lambda: asyncio.to_thread(get_llm)),
+            ("embed_model", lambda: asyncio.to_thread(get_embed_model)),
+            ("travel_guide", lambda: asyncio.to_thread(get_travel_guide_tool)),
+            ("agent_pool", app.state.agent_pool.warm_up),
+        ]
+    app.state.warmup = Warmup(steps)
+    app.state.warmup.start()
+    yield
+    await app.state.warmup.stop()
+    app.state.response_cache.persist()
+
+
+async def take_slot(request: Request) -> AsyncExitStack:
+    """Takes a concurrency slot for a request that calls the LLM without an agent."""
+    limiter: ConcurrencyLimiter = request.app.state.concurrency_limiter
+    stack = AsyncExitStack()
+    try:
+        await stack.enter_async_context(limiter.slot())
+    except ConcurrencyLimitTimeout as e:
+        await stack.aclose()
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
+    return stack
+
+
+async def checkout_agent(request: Request) -> tuple[ReActAgent, AsyncExitStack]:
+    """Takes a concurrency slot and a pooled agent; closing the stack returns both."""
+    limiter: ConcurrencyLimiter = request.app.state.concurrency_limiter
+    pool: AgentPool = request.app.state.agent_pool
+    stack = AsyncExitStack()
+    try:
+        await stack.enter_async_context(limiter.slot())
+        agent = await stack.enter_async_context(pool.checkout())
+    except (ConcurrencyLimitTimeout, AgentPoolTimeout) as e:
+        await stack.aclose()
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
+    return agent, stack
+
+
+async def cached_agent_response(
+    request: Request, endpoint: str, scope: str, notes: list[str], prompt: str
+) -> AgentAPIResponse:
+    if not SETTINGS.response_cache_enabled:
+        agent, stack = await checkout_agent(request)
+        async with stack:
+            response = str(await agent.achat(prompt))
+        return AgentAPIResponse(status="OK", agent_response=response)
+
+    cache: ResponseCache = request.app.state.response_cache
+    key = cache.make_key(endpoint, scope, notes)
+    response, embedding = await cache.lookup(key, endpoint, scope, notes)
+    if response is None:
+        agent, stack = await checkout_agent(request)
+        async with stack:
+            response = str(await agent.achat(prompt))
+        cache.put(key, endpoint, scope, prompt, response, embedding, notes)
+    return AgentAPIResponse(status="OK", agent_response=response)
+
+
+async def stream_agent_response(
+    request: Request, prompt: str, trip_id: str | None = None
+) -> StreamingResponse:
+    # The agent is checked out here rather than through Depends because
+    # dependency teardown runs before a streaming body has been sent.
+    agent, stack = await checkout_agent(request)
+
+    async def events() -> AsyncIterator[str]:
+        with trip_scope(trip_id):
+            async with stack:
+                try:
+                    async for event, data in stream_agent_events(agent, prompt):
+                        yield sse_event(event, data)
+                except Exception as e:
+                    yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+app = FastAPI(title="AI Agent", lifespan=lifespan)
+app.add_middleware(TracingMiddleware)
 
 
 def reserve_flight_message(date_str: str, departure: str, destination: str) -> str:
@@ -30,6 +208,11 @@ def reserve_bus_message(date_str: str, departure: str, destination: str) -> str:
 class InvalidDateOrderException(Exception):
     pass
 
+
+def check_hotel_dates(start_date: date, end_date: date) -> None:
+    if end_date <= start_date:
+        raise InvalidDateOrderException("La fecha de checkout debe ser posterior a la fecha de checkin")
+
 def reserve_hotel_message(
     start_date_str: str, end_date_str: str, hotel: str, city: str
 ) -> str:
@@ -44,59 +227,88 @@ def reserve_restaurant_message(
     )
 
 
+def cities_prompt(notes: list[str]) -> str:
+    return f"recommend the best cities in bolivia with the following notes: {notes}"
+
+
+def recommendation_prompt(subject: str, city: str, notes: list[str]) -> str:
+    prompt = f"Recommend the best {subject} in {city}"
+    if notes:
+        prompt += f" based on the following notes: {', '.join(notes)}"
+    return prompt
+
+
 @app.get("/recommendations/cities")
-def recommend_cities(
-    notes: list[str] = Query(...), agent: ReActAgent = Depends(get_agent)
+async def recommend_cities(
+    request: Request, notes: list[str] = Query(...)
 ) -> AgentAPIResponse:
-    prompt = f"recommend the best cities in bolivia with the following notes: {notes}"
-    return AgentAPIResponse(status="OK", agent_response=str(agent.chat(prompt)))
+    return await cached_agent_response(
+        request, "cities", "", notes, cities_prompt(notes)
+    )
+
+
+@app.get("/recommendations/cities/stream")
+async def stream_recommend_cities(
+    request: Request, notes: list[str] = Query(...)
+) -> StreamingResponse:
+    return await stream_agent_response(request, cities_prompt(notes))
 
 
 @app.get("/recommendations/places")
-def recommend_places(
-    city: str,
-    notes: list[str] = Query(default=[]),
-    agent: ReActAgent = Depends(get_agent),
+async def recommend_places(
+    request: Request, city: str, notes: list[str] = Query(default=[])
 ) -> AgentAPIResponse:
-    prompt = f"Recommend the best places to visit in {city}"
-    if notes:
-        prompt += f" based on the following notes: {', '.join(notes)}"
-    response = agent.chat(prompt)
-    return AgentAPIResponse(status="OK", agent_response=str(response))
+    prompt = recommendation_prompt("places to visit", city, notes)
+    return await cached_agent_response(request, "places", city, notes, prompt)
+
+
+@app.get("/recommendations/places/stream")
+async def stream_recommend_places(
+    request: Request, city: str, notes: list[str] = Query(default=[])
+) -> StreamingResponse:
+    prompt = recommendation_prompt("places to visit", city, notes)
+    return await stream_agent_response(request, prompt)
 
 
 @app.get("/recommendations/hotels")
-def recommend_hotels(
-    city: str,
-    notes: list[str] = Query(default=[]),
-    agent: ReActAgent = Depends(get_agent),
+async def recommend_hotels(
+    request: Request, city: str, notes: list[str] = Query(default=[])
 ) -> AgentAPIResponse:
-    prompt = f"Recommend the best hotels to stay in {city}"
-    if notes:
-        prompt += f" based on the following notes: {', '.join(notes)}"
-    response = agent.chat(prompt)
-    return AgentAPIResponse(status="OK", agent_response=str(response))
+    prompt = recommendation_prompt("hotels to stay", city, notes)
+    return await cached_agent_response(request, "hotels", city, notes, prompt)
+
+
+@app.get("/recommendations/hotels/stream")
+async def stream_recommend_hotels(
+    request: Request, city: str, notes: list[str] = Query(default=[])
+) -> StreamingResponse:
+    prompt = recommendation_prompt("hotels to stay", city, notes)
+    return await stream_agent_response(request, prompt)
 
 
 @app.get("/recommendations/activities")
-def recommend_activities(
-    city: str,
-    notes: list[str] = Query(default=[]),
-    agent: ReActAgent = Depends(get_agent),
+async def recommend_activities(
+    request: Request, city: str, notes: list[str] = Query(default=[])
 ) -> AgentAPIResponse:
-    prompt = f"Recommend the best activities to do in {city}"
-    if notes:
-        prompt += f" based on the following notes: {', '.join(notes)}"
-    response = agent.chat(prompt)
-    return AgentAPIResponse(status="OK", agent_response=str(response))
+    prompt = recommendation_prompt("activities to do", city, notes)
+    return await cached_agent_response(request, "activities", city, notes, prompt)
+
+
+@app.get("/recommendations/activities/stream")
+async def stream_recommend_activities(
+    request: Request, city: str, notes: list[str] = Query(default=[])
+) -> StreamingResponse:
+    prompt = recommendation_prompt("activities to do", city, notes)
+    return await stream_agent_response(request, prompt)
 
 
 @app.post("/reservations/flight", response_model=ReservationAPIResponse)
 def reserve_flight_endpoint(
-    origin: str, destination: str, travel_date: date
+    origin: str, destination: str, travel_date: date, trip_id: TripId = None
 ) -> ReservationAPIResponse:
     try:
-        reserve_flight(travel_date.isoformat(), origin, destination)
+        with trip_scope(trip_id):
+            reserve_flight(travel_date.isoformat(), origin, destination)
         return ReservationAPIResponse(
             status="Success",
             message=reserve_flight_message(
@@ -109,13 +321,14 @@ def reserve_flight_endpoint(
 
 @app.post("/reservations/bus", response_model=ReservationAPIResponse)
 def reserve_bus_endpoint(
-    origin: str, destination: str, travel_date: date
+    origin: str, destination: str, travel_date: date, trip_id: TripId = None
 ) -> ReservationAPIResponse:
     try:
-        reserve_bus(travel_date.isoformat(), origin, destination)
+        with trip_scope(trip_id):
+            reserve_bus(travel_date.isoformat(), origin, destination)
         return ReservationAPIResponse(
             status="Success",
-            message=reserve_bus(travel_date.isoformat(), origin, destination),
+            message=reserve_bus_message(travel_date.isoformat(), origin, destination),
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -123,12 +336,12 @@ def reserve_bus_endpoint(
 
 @app.post("/reservations/hotel", response_model=ReservationAPIResponse)
 def reserve_hotel_endpoint(
-    start_date: date, end_date: date, hotel: str, city: str
+    start_date: date, end_date: date, hotel: str, city: str, trip_id: TripId = None
 ) -> ReservationAPIResponse:
     try:
-        if end_date <= start_date:
-            raise InvalidDateOrderException("La fecha de checkout debe ser posterior a la fecha de checkin")
-        reserve_hotel(start_date.isoformat(), end_date.isoformat(), hotel, city)
+        check_hotel_dates(start_date, end_date)
+        with trip_scope(trip_id):
+            reserve_hotel(start_date.isoformat(), end_date.isoformat(), hotel, city)
         return ReservationAPIResponse(
             status="Success",
             message=reserve_hotel_message(
@@ -141,12 +354,17 @@ def reserve_hotel_endpoint(
 
 @app.post("/reservations/restaurant", response_model=ReservationAPIResponse)
 def reserve_restaurant_endpoint(
-    reservation_date: date, time: time, restaurant: str, city: str
+    reservation_date: date,
+    time: time,
+    restaurant: str,
+    city: str,
+    trip_id: TripId = None,
 ) -> ReservationAPIResponse:
     try:
-        reserve_restaurant(
-            datetime.combine(reservation_date, time).isoformat(), restaurant, city
-        )
+        with trip_scope(trip_id):
+            reserve_restaurant(
+                datetime.combine(reservation_date, time).isoformat(), restaurant, city
+            )
         return ReservationAPIResponse(
             status="Success",
             message=reserve_restaurant_message(
@@ -157,11 +375,228 @@ def reserve_restaurant_endpoint(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/trip/report")
-def generate_trip_report(agent: ReActAgent = Depends(get_agent)) -> AgentAPIResponse:
+def build_booking(
+    booking: FlightBooking | BusBooking | HotelBooking | RestaurantBooking,
+):
+    """The reservation for a batch item and its confirmation message."""
+    if isinstance(booking, FlightBooking):
+        args = (booking.travel_date.isoformat(), booking.origin, booking.destination)
+        return build_flight_reservation(*args), reserve_flight_message(*args)
+    if isinstance(booking, BusBooking):
+        args = (booking.travel_date.isoformat(), booking.origin, booking.destination)
+        return build_bus_reservation(*args), reserve_bus_message(*args)
+    if isinstance(booking, HotelBooking):
+        check_hotel_dates(booking.start_date, booking.end_date)
+        args = (
+            booking.start_date.isoformat(),
+            booking.end_date.isoformat(),
+            booking.hotel,
+            booking.city,
+        )
+        return build_hotel_reservation(*args), reserve_hotel_message(*args)
+    reservation = build_restaurant_reservation(
+        datetime.combine(booking.reservation_date, booking.time).isoformat(),
+        booking.restaurant,
+        booking.city,
+        booking.dish,
+    )
+    return reservation, reserve_restaurant_message(
+        booking.reservation_date.isoformat(),
+        booking.time.isoformat(),
+        booking.restaurant,
+        booking.city,
+    )
+
+
+@app.post("/reservations/batch", response_model=BatchReservationResponse)
+def reserve_batch_endpoint(
+    request: BatchReservationRequest, trip_id: TripId = None
+) -> BatchReservationResponse:
+    """Books every item or none: all are validated before a single write."""
+    if len(request.reservations) > SETTINGS.reservation_batch_max_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {SETTINGS.reservation_batch_max_size} reservations per batch",
+        )
+    reservations = []
+    results = []
+    for index, booking in enumerate(request.reservations):
+        try:
+            reservation, message = build_booking(booking)
+        except Exception as e:
+            results.append(
+                BatchReservationItem(
+                    index=index, type=booking.type, status="Error", message=str(e)
+                )
+            )
+            continue
+        reservations.append(reservation)
+        results.append(
+            BatchReservationItem(
+                index=index,
+                type=booking.type,
+                status="Success",
+                message=message,
+                cost=reservation.cost,
+            )
+        )
+
+    if len(reservations) < len(results):
+        # Nothing is saved; the successful items are reported as not booked.
+        for result in results:
+            if result.status == "Success":
+                result.status = "Skipped"
+                result.message = "Not booked, other reservations in the batch are invalid"
+                result.cost = None
+        response = BatchReservationResponse(status="Error", saved=0, results=results)
+        return JSONResponse(status_code=400, content=response.model_dump(mode="json"))
+
     try:
-        prompt = f"Generate a detailed travel report of my trip"
-        response = agent.chat(prompt)
-        return AgentAPIResponse(status="OK", agent_response=str(response))
+        with trip_scope(trip_id):
+            save_reservations(reservations)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return BatchReservationResponse(
+        status="Success", saved=len(reservations), results=results
+    )
+
+
+TRIP_REPORT_PROMPT = "Generate a detailed travel report of my trip"
+
+
+@app.get("/trip/reservations")
+def list_reservations(trip_id: TripId = None) -> list[dict]:
+    try:
+        with trip_scope(trip_id):
+            return list(load_reservations())
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Trip log file not found")
+
+
+def trip_report_etag() -> str:
+    try:
+        return make_etag(trip_log_version())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Trip log file not found")
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    if not etag_matches(request.headers.get("if-none-match"), etag):
+        return None
+    TRIP_REPORTS.inc(result="not_modified")
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+@app.get("/trip/report")
+async def generate_trip_report(
+    request: Request, response: Response, trip_id: TripId = None
+) -> AgentAPIResponse:
+    with trip_scope(trip_id):
+        etag = trip_report_etag()
+        if (cached := not_modified(request, etag)) is not None:
+            return cached
+        cache: TripReportCache = request.app.state.trip_report_cache
+
+        async def generate() -> str:
+            if SETTINGS.trip_report_mode == "direct":
+                stack = await take_slot(request)
+            else:
+                agent, stack = await checkout_agent(request)
+            async with stack:
+                if SETTINGS.trip_report_mode == "direct":
+                    return await direct_trip_report()
+                return str(await agent.achat(TRIP_REPORT_PROMPT))
+
+        try:
+            report = await cache.get_or_generate(trip_id, etag, generate)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Trip log file not found")
+    response.headers["ETag"] = etag
+    return AgentAPIResponse(status="OK", agent_response=report)
+
+
+@app.get("/trip/report/stream")
+async def stream_trip_report(request: Request, trip_id: TripId = None) -> StreamingResponse:
+    if SETTINGS.trip_report_mode != "direct":
+        return await stream_agent_response(request, TRIP_REPORT_PROMPT, trip_id)
+    cache: TripReportCache = request.app.state.trip_report_cache
+    try:
+        with trip_scope(trip_id):
+            etag = make_etag(trip_log_version())
+    except FileNotFoundError:
+        # Streamed as an error event, like the other failures.
+        etag = None
+    if etag is not None and (cached := not_modified(request, etag)) is not None:
+        return cached
+    headers = {"ETag": etag} if etag is not None else {}
+    report = cache.get(trip_id, etag) if etag is not None else None
+    if report is not None:
+        TRIP_REPORTS.inc(result="cached")
+
+        async def replay() -> AsyncIterator[str]:
+            yield sse_event("token", {"text": report})
+            yield sse_event("done", {})
+
+        return StreamingResponse(replay(), media_type="text/event-stream", headers=headers)
+    stack = await take_slot(request)
+
+    async def events() -> AsyncIterator[str]:
+        # The body is sent after the endpoint returns, the trip is set here.
+        with trip_scope(trip_id):
+            async with stack:
+                try:
+                    tokens = []
+                    async for token in stream_direct_trip_report():
+                        tokens.append(token)
+                        yield sse_event("token", {"text": token})
+                    if etag is not None:
+                        cache.put(trip_id, etag, "".join(tokens))
+                    TRIP_REPORTS.inc(result="generated")
+                    yield sse_event("done", {})
+                except FileNotFoundError:
+                    yield sse_event("error", {"detail": "Trip log file not found"})
+                except Exception as e:
+                    yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@app.get("/health/ready")
+def readiness(request: Request, response: Response) -> ReadinessStatus:
+    status = request.app.state.warmup.status()
+    if not status.ready:
+        response.status_code = 503
+    return status
+
+
+@app.get("/metrics")
+def prometheus_metrics() -> Response:
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/metrics/traces")
+def request_traces(limit: int = Query(default=20, ge=1)) -> list[RequestTrace]:
+    """Spans of the latest requests, newest first."""
+    return list(reversed(recent_traces))[:limit]
+
+
+@app.get("/metrics/agent-pool")
+def agent_pool_metrics(request: Request) -> AgentPoolStats:
+    return request.app.state.agent_pool.stats()
+
+
+@app.get("/metrics/response-cache")
+def response_cache_metrics(request: Request) -> ResponseCacheStats:
+    return request.app.state.response_cache.stats()
+
+
+@app.get("/metrics/embedding-cache")
+def embedding_cache_metrics() -> EmbeddingCacheStats:
+    if not is_embed_model_loaded():
+        raise HTTPException(status_code=503, detail="Embedding model not loaded yet")
+    return get_embed_model().stats()
+
+
+@app.get("/metrics/concurrency")
+def concurrency_metrics(request: Request) -> ConcurrencyStats:
+    return request.app.state.concurrency_limiter.stats()
@@ -0,0 +1,215 @@
+import os
+import re
+import json
+import unicodedata
+from typing import Iterable
+import numpy as np
+
+BM25_FNAME = "bm25.json"
+
+TOKEN_RE = re.compile(r"[a-z0-9ñ]+")
+
+# Spanish function words, plus the English ones of the guide text.
+STOPWORDS = frozenset(
+    """
+    a al algo algun alguna algunas alguno algunos ante antes aqui asi aun cada como con
+    contra cual cuales cuando cuanto de del desde dime donde dos e el ella ellas ellos en
+    entre era es esa esas ese eso esos esta estan estas este esto estos fue fueron ha hay
+    hasta la las le les lo los mas me mi mis mucho muy ni no nos o otra otras otro otros
+    para pero poco por porque puedo puedes que quien quiero quisiera recomienda
+    recomiendas se sea ser si sin sobre son su sus tambien tan te tiene tienen todo
+    todos tu tus un una unas uno unos y ya yo
+    an and are as at be by for from has have in is it its of on or that the their there
+    this to was were what which with you your
+    """.split()
+)
+
+
+def _strip_accents(text: str) -> str:
+    # Keep ñ, it distinguishes words (año / ano); drop every other diacritic.
+    text = text.replace("ñ", "\0")
+    text = "".join(
+        char
+        for char in unicodedata.normalize("NFKD", text)
+        if not unicodedata.combining(char)
+    )
+    return text.replace("\0", "ñ")
+
+
+def stem(token: str) -> str:
+    """Light Spanish stemmer: folds plural and gender endings only.
+
+    hoteles -> hotel, ciudades -> ciudad, museos / museo -> muse. Aggressive
+    stemming hurts precision on place names, so nothing else is removed.
+    """
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith("es") and len(token) > 4 and token[-3] not in "aeiou":
+        token = token[:-2]
+    elif token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in "aoe":
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    text = _strip_accents(text.lower())
+    return [stem(token) for token in TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Inverted index over node text, scored with Okapi BM25.
+
+    Every term maps to the rows of the nodes containing it and its frequency in
+    each of them. Query terms' postings are scored on demand, so the statistics
+    (document lengths, idf) stay correct as nodes are added and removed.
+    """
+
+    def __init__(
+        self,
+        node_ids: list[str],
+        lengths: np.ndarray,
+        postings: dict[str, tuple[np.ndarray, np.ndarray]],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.node_ids = node_ids
+        self.lengths = lengths
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.row_by_id = {node_id: row for row, node_id in enumerate(node_ids)}
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @classmethod
+    def build(cls, items: Iterable[tuple[str, str]]) -> "BM25Index":
+        """Indexes (node_id, text) pairs."""
+        index = cls([], np.empty(0, dtype=np.int32), {})
+        index.add(items)
+        return index
+
+    def add(self, items: Iterable[tuple[str, str]]) -> None:
+        new_postings: dict[str, tuple[list[int], list[int]]] = {}
+        lengths = []
+        for node_id, text in items:
+            if node_id in self.row_by_id:
+                continue
+            row = len(self.node_ids)
+            self.node_ids.append(node_id)
+            self.row_by_id[node_id] = row
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            counts: dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, count in counts.items():
+                rows, freqs = new_postings.setdefault(term, ([], []))
+                rows.append(row)
+                freqs.append(count)
+        self.lengths = np.concatenate([self.lengths, np.asarray(lengths, dtype=np.int32)])
+        for term, (rows, freqs) in new_postings.items():
+            rows = np.asarray(rows, dtype=np.int32)
+            freqs = np.asarray(freqs, dtype=np.int32)
+            if term in self.postings:
+                old_rows, old_freqs = self.postings[term]
+                rows = np.concatenate([old_rows, rows])
+                freqs = np.concatenate([old_freqs, freqs])
+            self.postings[term] = (rows, freqs)
+
+    def remove(self, node_ids: Iterable[str]) -> None:
+        removed = np.zeros(len(self.node_ids), dtype=bool)
+        for node_id in node_ids:
+            if node_id in self.row_by_id:
+                removed[self.row_by_id[node_id]] = True
+        if not removed.any():
+            return
+        # Rows are renumbered so that the postings stay dense.
+        new_rows = np.cumsum(~removed) - 1
+        for term, (rows, freqs) in list(self.postings.items()):
+            keep = ~removed[rows]
+            if keep.all():
+                self.postings[term] = (new_rows[rows].astype(np.int32), freqs)
+            elif keep.any():
+                self.postings[term] = (new_rows[rows[keep]].astype(np.int32), freqs[keep])
+            else:
+                del self.postings[term]
+        self.node_ids = [
+            node_id for node_id, gone in zip(self.node_ids, removed) if not gone
+        ]
+        self.lengths = self.lengths[~removed]
+        self.row_by_id = {node_id: row for row, node_id in enumerate(self.node_ids)}
+
+    def search(
+        self, terms: list[str], top_k: int, node_ids: list[str] | None = None
+    ) -> list[tuple[str, float, float]]:
+        """(node_id, score, share of the terms the node contains), best first.
+
+        With node_ids only those nodes are considered.
+        """
+        terms = list(dict.fromkeys(terms))
+        n_docs = len(self.node_ids)
+        if not terms or not n_docs:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        matched = np.zeros(n_docs, dtype=np.int32)
+        avg_length = max(float(self.lengths.mean()), 1.0)
+        for term in terms:
+            if term not in self.postings:
+                continue
+            rows, freqs = self.postings[term]
+            idf = np.log(1.0 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.lengths[rows] / avg_length)
+            scores[rows] += idf * freqs * (self.k1 + 1.0) / (freqs + norm)
+            matched[rows] += 1
+        if node_ids is not None:
+            allowed = np.zeros(n_docs, dtype=bool)
+            allowed[[self.row_by_id[i] for i in node_ids if i in self.row_by_id]] = True
+            matched[~allowed] = 0
+        candidates = np.flatnonzero(matched)
+        if not len(candidates):
+            return []
+        best = candidates[np.argsort(-scores[candidates], kind="stable")[:top_k]]
+        return [
+            (self.node_ids[row], float(scores[row]), float(matched[row]) / len(terms))
+            for row in best
+        ]
+
+    def save(self, persist_dir: str) -> None:
+        path = os.path.join(persist_dir, BM25_FNAME)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(
+                {
+                    "k1": self.k1,
+                    "b": self.b,
+                    "ids": self.node_ids,
+                    "lengths": self.lengths.tolist(),
+                    "postings": {
+                        term: [rows.tolist(), freqs.tolist()]
+                        for term, (rows, freqs) in self.postings.items()
+                    },
+                },
+                file,
+            )
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, BM25_FNAME))
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "BM25Index":
+        with open(os.path.join(persist_dir, BM25_FNAME), "r") as file:
+            data = json.load(file)
+        return cls(
+            data["ids"],
+            np.asarray(data["lengths"], dtype=np.int32),
+            {
+                term: (np.asarray(rows, dtype=np.int32), np.asarray(freqs, dtype=np.int32))
+                for term, (rows, freqs) in data["postings"].items()
+            },
+            k1=data["k1"],
+            b=data["b"],
+        )
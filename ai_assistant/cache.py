@@ -0,0 +1,213 @@
+import os
+import re
+import json
+import asyncio
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+from pydantic import BaseModel
+from ai_assistant.models import ResponseCacheStats
+from ai_assistant.regions import find_places
+
+MONTHS = {
+    "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+    "septiembre", "setiembre", "octubre", "noviembre", "diciembre",
+    "january", "february", "march", "april", "may", "june", "july", "august",
+    "september", "october", "november", "december",
+}
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.split())
+
+
+def normalize_notes(notes: list[str]) -> str:
+    return "; ".join(sorted(normalize_text(note) for note in notes))
+
+
+def note_facets(notes: list[str]) -> str:
+    """The places, numbers (dates, budgets, group sizes) and months the notes name.
+
+    Similar notes are only interchangeable when these are identical: "viaje en
+    mayo con 2 niños" and "viaje en junio con 3 niños" embed almost the same.
+    """
+    text = normalize_notes(notes)
+    cities, departments = find_places(text)
+    numbers = re.findall(r"\d+", text)
+    months = [word for word in re.findall(r"[a-z]+", text) if word in MONTHS]
+    return json.dumps(
+        [sorted(cities), sorted(departments), sorted(numbers), sorted(set(months))]
+    )
+
+
+class CacheEntry(BaseModel):
+    key: str
+    endpoint: str
+    scope: str
+    prompt: str
+    response: str
+    created_at: float
+    embedding: list[float] | None = None
+    facets: str | None = None
+
+
+class ResponseCache:
+    """LRU cache of agent answers with an exact key and a semantic fallback.
+
+    The semantic lookup embeds only the user's notes, not the prompt template
+    around them, and only compares entries of the same endpoint, scope (the
+    normalised city) and note facets. It can match rephrased notes but never
+    answers a question about one city, month or group size with a response
+    about another.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], list[float]] | None = None,
+        similarity_threshold: float = 0.97,
+        ttl: float = 3600.0,
+        max_size: int = 512,
+        persist_path: str | None = None,
+    ):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.persist_path = persist_path
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._exact_hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(endpoint: str, scope: str, notes: list[str]) -> str:
+        normalized_notes = sorted(normalize_text(note) for note in notes)
+        return json.dumps([endpoint, normalize_text(scope), normalized_notes])
+
+    @property
+    def semantic(self) -> bool:
+        return self.embed_fn is not None
+
+    def embed(self, notes: list[str]) -> list[float]:
+        return self.embed_fn(normalize_notes(notes))
+
+    def _expired(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.created_at > self.ttl
+
+    def get_exact(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self._exact_hits += 1
+        return entry.response
+
+    def get_similar(
+        self, endpoint: str, scope: str, facets: str, embedding: list[float]
+    ) -> str | None:
+        scope = normalize_text(scope)
+        candidates = [
+            entry
+            for entry in self._entries.values()
+            if entry.endpoint == endpoint
+            and entry.scope == scope
+            and entry.facets == facets
+            and entry.embedding is not None
+            and not self._expired(entry)
+        ]
+        if candidates:
+            matrix = np.asarray([entry.embedding for entry in candidates])
+            query = np.asarray(embedding)
+            similarities = matrix @ query / (
+                np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12
+            )
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                self._entries.move_to_end(candidates[best].key)
+                self._semantic_hits += 1
+                return candidates[best].response
+        return None
+
+    async def lookup(
+        self, key: str, endpoint: str, scope: str, notes: list[str]
+    ) -> tuple[str | None, list[float] | None]:
+        """Returns a cached response, or None plus the notes embedding to store."""
+        response = self.get_exact(key)
+        if response is not None:
+            return response, None
+        embedding = None
+        # Without notes the exact key already covers every equivalent request.
+        if self.semantic and notes:
+            # The embedding model is CPU bound, keep it off the event loop.
+            embedding = await asyncio.to_thread(self.embed, notes)
+            response = self.get_similar(endpoint, scope, note_facets(notes), embedding)
+            if response is not None:
+                return response, embedding
+        self._misses += 1
+        return None, embedding
+
+    def put(
+        self,
+        key: str,
+        endpoint: str,
+        scope: str,
+        prompt: str,
+        response: str,
+        embedding: list[float] | None = None,
+        notes: list[str] | None = None,
+    ) -> None:
+        self._entries[key] = CacheEntry(
+            key=key,
+            endpoint=endpoint,
+            scope=normalize_text(scope),
+            prompt=prompt,
+            response=response,
+            created_at=time.time(),
+            embedding=embedding,
+            facets=note_facets(notes or []),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def load(self) -> None:
+        if self.persist_path is None or not os.path.exists(self.persist_path):
+            return
+        with open(self.persist_path, "r") as file:
+            entries = [CacheEntry(**entry) for entry in json.load(file)]
+        for entry in entries:
+            if not self._expired(entry):
+                self._entries[entry.key] = entry
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def persist(self) -> None:
+        if self.persist_path is None:
+            return
+        tmp_path = f"{self.persist_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump([entry.model_dump() for entry in self._entries.values()], file)
+        os.replace(tmp_path, self.persist_path)
+
+    def stats(self) -> ResponseCacheStats:
+        lookups = self._exact_hits + self._semantic_hits + self._misses
+        return ResponseCacheStats(
+            size=len(self._entries),
+            max_size=self.max_size,
+            exact_hits=self._exact_hits,
+            semantic_hits=self._semantic_hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            hit_rate=(self._exact_hits + self._semantic_hits) / lookups
+            if lookups
+            else 0.0,
+        )
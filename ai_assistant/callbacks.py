@@ -0,0 +1,122 @@
+import time
+from typing import Any
+from llama_index.core import Settings
+from llama_index.core.callbacks import CallbackManager, CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+from llama_index.core.callbacks.token_counting import get_llm_token_counts
+from llama_index.core.utilities.token_counting import TokenCounter
+from ai_assistant.metrics import (
+    EVENT_SECONDS,
+    LLM_TOKENS,
+    TOOL_SECONDS,
+    add_span,
+    current_trace,
+)
+
+EVENT_NAMES = {
+    CBEventType.LLM: "llm",
+    CBEventType.EMBEDDING: "embedding",
+    CBEventType.RETRIEVE: "retrieve",
+    CBEventType.RERANKING: "rerank",
+    CBEventType.SYNTHESIZE: "synthesize",
+    CBEventType.QUERY: "query",
+    CBEventType.AGENT_STEP: "agent_chat",
+}
+
+
+class TracingHandler(BaseCallbackHandler):
+    """Times LlamaIndex events into the metrics and the current request's trace.
+
+    Covers the LLM calls of each ReAct step (with their token counts), the
+    tools the agent calls, and the travel guide's embedding, retrieval and
+    synthesis.
+    """
+
+    def __init__(self):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self._started: dict[str, tuple[CBEventType, str, float, str]] = {}
+        self._token_counter: TokenCounter | None = None
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: dict[str, Any] | None = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any,
+    ) -> str:
+        if event_type == CBEventType.FUNCTION_CALL:
+            # Only the start payload names the tool.
+            tool = getattr((payload or {}).get(EventPayload.TOOL), "name", None)
+            name = tool or "unknown"
+        elif event_type in EVENT_NAMES:
+            name = EVENT_NAMES[event_type]
+        else:
+            return event_id
+        self._started[event_id] = (event_type, name, time.perf_counter(), parent_id)
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: dict[str, Any] | None = None,
+        event_id: str = "",
+        **kwargs: Any,
+    ) -> None:
+        started = self._started.pop(event_id, None)
+        if started is None:
+            return
+        _, name, start, parent_id = started
+        end = time.perf_counter()
+
+        if event_type == CBEventType.FUNCTION_CALL:
+            TOOL_SECONDS.observe(end - start, tool=name)
+            add_span("tool", name, start, end)
+            return
+        parent = self._started.get(parent_id)
+        if event_type == CBEventType.RETRIEVE and parent and parent[0] == event_type:
+            # The hybrid and partitioned retrievers wrap the vector retriever,
+            # only the outermost retrieval is recorded.
+            return
+
+        EVENT_SECONDS.observe(end - start, event=name)
+        if event_type != CBEventType.LLM:
+            add_span(name, name, start, end)
+            return
+        prompt_tokens, completion_tokens = self._count_tokens(payload or {})
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, kind="completion")
+        add_span(name, name, start, end, None, prompt_tokens, completion_tokens)
+        trace = current_trace()
+        if trace is not None:
+            trace.llm_calls += 1
+            trace.prompt_tokens += prompt_tokens
+            trace.completion_tokens += completion_tokens
+
+    def _count_tokens(self, payload: dict[str, Any]) -> tuple[int, int]:
+        # The usage reported by the API when there is one, tiktoken otherwise.
+        if self._token_counter is None:
+            self._token_counter = TokenCounter()
+        try:
+            counts = get_llm_token_counts(self._token_counter, payload)
+        except ValueError:
+            return 0, 0
+        return counts.prompt_token_count, counts.completion_token_count
+
+    def start_trace(self, trace_id: str | None = None) -> None:
+        pass
+
+    def end_trace(
+        self,
+        trace_id: str | None = None,
+        trace_map: dict[str, list[str]] | None = None,
+    ) -> None:
+        pass
+
+
+def install_tracing() -> None:
+    """Sets the global callback manager, which LLMs, embedding models, retrievers
+    and agents created afterwards (or assigned to Settings) use."""
+    handlers = Settings.callback_manager.handlers
+    if not any(isinstance(handler, TracingHandler) for handler in handlers):
+        Settings.callback_manager = CallbackManager([*handlers, TracingHandler()])
@@ -1,13 +1,28 @@
 import gradio as gr
-from ai_assistant.prompts import agent_prompt_tpl
+from ai_assistant.config import get_agent_settings
+from ai_assistant.prompts import chatbot_prompt_tpl
 from ai_assistant.agent import TravelAgent
+from ai_assistant.sessions import SessionAgents, build_chat_memory
+from ai_assistant.trips import trip_scope
 
-agent = TravelAgent(agent_prompt_tpl).get_agent()
+SETTINGS = get_agent_settings()
 
-def agent_response(message, history):
-    return agent.chat(
-        f"{message},\nUtiliza las herramientas travel_guide si se requiere información\nUsar bus_tool, flight_tool, restaruant_tool, hotel_tool si se requiere hacer una reservación\nFinalmente usa trip_summary para obtener el informe y/o planificación de mi viaje"
-    ).response
+sessions = SessionAgents(
+    factory=lambda: TravelAgent(chatbot_prompt_tpl, memory=build_chat_memory()).get_agent(),
+    max_sessions=SETTINGS.chatbot_max_sessions,
+    ttl=SETTINGS.chatbot_session_ttl,
+)
+
+def agent_response(message, history, request: gr.Request):
+    agent = sessions.get(request.session_hash)
+    # Each chat session books into its own trip. The tools run inside
+    # stream_chat, only the final answer streams afterwards.
+    with trip_scope(request.session_hash):
+        response = agent.stream_chat(message)
+    partial_response = ""
+    for token in response.response_gen:
+        partial_response += token
+        yield partial_response
 
 
 if __name__ == "__main__":
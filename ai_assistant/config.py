@@ -1,4 +1,5 @@
 from functools import cache
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,10 +8,64 @@ class AgentSettings(BaseSettings):
 
     openai_model: str = "gpt4o-mini"
     hf_embeddings_model: str = "intfloat/multilingual-e5-base"
+    embedding_cache_size: int = 2048
+    embedding_cache_path: str | None = None
     travel_guide_store_path: str = "travel_guide_store"
     travel_guide_data_path: str = "data"
+    travel_guide_incremental_ingest: bool = False
+    ingest_workers: int = 0
+    ingest_batch_size: int = 64
+    vector_store_backend: Literal["simple", "memmap"] = "simple"
+    docstore_backend: Literal["json", "binary"] = "json"
+    ann_index: Literal["none", "ivf"] = "none"
+    ivf_nlist: int = 0
+    ivf_nprobe: int = 8
+    vector_quantization: Literal["none", "int8"] = "none"
+    rerank_factor: int = 4
+    travel_guide_retriever: Literal["vector", "hybrid"] = "vector"
+    hybrid_candidates: int = 10
+    hybrid_rrf_k: int = 60
+    keyword_fast_path_max_terms: int = 3
+    travel_guide_partitions: bool = False
+    partition_min_nodes: int = 5
+    travel_guide_fanout: bool = False
+    fanout_max_concurrency: int = 4
+    fanout_max_subqueries: int = 8
     openai_api_key: str = "key"
     log_file: str = "trip.json"
+    trip_logs_dir: str = "trips"
+    trip_summary_cache_size: int = 256
+    log_format: Literal["json", "jsonl"] = "json"
+    log_fsync: Literal["always", "interval", "never"] = "always"
+    log_fsync_interval: float = 1.0
+    reservation_backend: Literal["file", "sqlite"] = "file"
+    reservation_batch_max_size: int = 100
+    sqlite_path: str = "trip.sqlite"
+    trip_report_mode: Literal["direct", "agent"] = "direct"
+    trip_report_guide_context: bool = True
+    trip_report_max_cities: int = 5
+    trip_report_guide_nodes: int = 2
+    trip_report_cache: bool = True
+    trip_report_cache_size: int = 256
+    chatbot_max_sessions: int = 100
+    chatbot_session_ttl: float = 1800.0
+    chat_memory: Literal["buffer", "summary"] = "buffer"
+    chat_memory_token_limit: int = 3000
+    agent_pool_size: int = 4
+    agent_pool_max_size: int = 256
+    agent_pool_timeout: float = 30.0
+    api_max_concurrency: int = 256
+    api_queue_timeout: float = 10.0
+    api_warmup: bool = True
+    agent_verbose: bool = True
+    tracing_enabled: bool = True
+    trace_buffer_size: int = 100
+    response_cache_enabled: bool = True
+    response_cache_semantic: bool = True
+    response_cache_similarity: float = 0.97
+    response_cache_ttl: float = 3600.0
+    response_cache_max_size: int = 512
+    response_cache_path: str | None = None
 
 
 @cache
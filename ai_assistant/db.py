@@ -0,0 +1,182 @@
+import json
+from typing import Iterator
+from piccolo.engine.sqlite import SQLiteEngine
+from piccolo.table import Table, create_db_tables_sync
+from piccolo.columns import Varchar, Date, Timestamp, Integer
+from ai_assistant.models import (
+    RestaurantReservation,
+    TripReservation,
+    HotelReservation,
+)
+from ai_assistant.config import get_agent_settings
+
+SETTINGS = get_agent_settings()
+
+DB = SQLiteEngine(path=SETTINGS.sqlite_path)
+
+
+class TripReservationTable(Table, db=DB, tablename="trip_reservation"):
+    trip_id = Varchar(length=64, index=True)
+    trip_type = Varchar(length=16, index=True)
+    date = Date(index=True)
+    departure = Varchar(index=True)
+    destination = Varchar(index=True)
+    cost = Integer()
+
+
+class HotelReservationTable(Table, db=DB, tablename="hotel_reservation"):
+    trip_id = Varchar(length=64, index=True)
+    checkin_date = Date(index=True)
+    checkout_date = Date()
+    hotel_name = Varchar()
+    city = Varchar(index=True)
+    cost = Integer()
+
+
+class RestaurantReservationTable(Table, db=DB, tablename="restaurant_reservation"):
+    trip_id = Varchar(length=64, index=True)
+    reservation_time = Timestamp(index=True)
+    restaurant = Varchar()
+    city = Varchar(index=True)
+    dish = Varchar()
+    cost = Integer()
+
+
+TABLES = {
+    TripReservation: TripReservationTable,
+    HotelReservation: HotelReservationTable,
+    RestaurantReservation: RestaurantReservationTable,
+}
+
+_tables_created = False
+
+
+def add_trip_id_columns() -> None:
+    """Partitions databases created before trips existed; their rows have no trip.
+
+    Runs before piccolo creates the indexes: SQLite would index a missing
+    "trip_id" column as the string literal.
+    """
+    for table in TABLES.values():
+        name = table._meta.tablename
+        columns = table.raw(f"PRAGMA table_info({name})").run_sync()
+        if columns and not any(column["name"] == "trip_id" for column in columns):
+            table.raw(
+                f"ALTER TABLE {name} ADD COLUMN trip_id VARCHAR(64) NOT NULL DEFAULT ''"
+            ).run_sync()
+
+
+def create_tables() -> None:
+    global _tables_created
+    if not _tables_created:
+        add_trip_id_columns()
+        create_db_tables_sync(*TABLES.values(), if_not_exists=True)
+        _tables_created = True
+
+
+def _row(
+    reservation: RestaurantReservation | TripReservation | HotelReservation,
+    trip_id: str | None = None,
+) -> Table:
+    values = reservation.model_dump()
+    values["trip_id"] = trip_id or ""
+    if "trip_type" in values:
+        values["trip_type"] = values["trip_type"].value
+    return TABLES[type(reservation)](**values)
+
+
+def insert_reservation(
+    reservation: RestaurantReservation | TripReservation | HotelReservation,
+    trip_id: str | None = None,
+) -> None:
+    create_tables()
+    table = TABLES[type(reservation)]
+    table.insert(_row(reservation, trip_id)).run_sync()
+
+
+def insert_reservations(
+    reservations: list[RestaurantReservation | TripReservation | HotelReservation],
+    trip_id: str | None = None,
+) -> None:
+    """Inserts the reservations in one transaction, one statement per table."""
+    create_tables()
+    rows_by_table: dict[type[Table], list[Table]] = {}
+    for reservation in reservations:
+        rows_by_table.setdefault(TABLES[type(reservation)], []).append(
+            _row(reservation, trip_id)
+        )
+    transaction = DB.atomic()
+    for table, rows in rows_by_table.items():
+        transaction.add(table.insert(*rows))
+    transaction.run_sync()
+
+
+def iter_reservations(trip_id: str | None = None) -> Iterator[dict]:
+    create_tables()
+    for model, table in TABLES.items():
+        rows = (
+            table.select(*table.all_columns(exclude=[table.id, table.trip_id]))
+            .where(table.trip_id == (trip_id or ""))
+            .run_sync()
+        )
+        for row in rows:
+            row["reservation_type"] = model.__name__
+            yield row
+
+
+# Every reservation type is projected to (place, date, description, cost) so the
+# three tables can be grouped by place in a single aggregate query. The {}
+# placeholders take the trip id, one per table. The order matches
+# summary.sort_activities, so both backends give the same summary.
+ACTIVITIES_SQL = """
+SELECT
+    departure || ' to ' || destination AS place,
+    date AS activity_date,
+    trip_type || ' from ' || departure || ' to ' || destination AS description,
+    cost
+FROM trip_reservation
+WHERE trip_id = {}
+UNION ALL
+SELECT
+    city,
+    checkin_date,
+    'Hotel stay at ' || hotel_name || ' from ' || checkin_date || ' to ' || checkout_date,
+    cost
+FROM hotel_reservation
+WHERE trip_id = {}
+UNION ALL
+SELECT
+    city,
+    strftime('%Y-%m-%dT%H:%M:%S', reservation_time),
+    'Restaurant reservation at ' || restaurant || ' at '
+        || strftime('%Y-%m-%dT%H:%M:%S', reservation_time) || '. Dish: ' || dish,
+    cost
+FROM restaurant_reservation
+WHERE trip_id = {}
+"""
+
+SUMMARY_SQL = f"""
+SELECT
+    place,
+    SUM(cost) AS place_cost,
+    json_group_array(
+        json_object(
+            'date', activity_date,
+            'description', description,
+            'cost', printf('$%.2f', cost)
+        )
+    ) AS activities
+FROM ({ACTIVITIES_SQL} ORDER BY place, activity_date, description, cost)
+GROUP BY place
+ORDER BY place
+"""
+
+
+def summarize_reservations(
+    trip_id: str | None = None,
+) -> tuple[float, dict[str, list[dict[str, str]]]]:
+    create_tables()
+    rows = TripReservationTable.raw(SUMMARY_SQL, *[trip_id or ""] * len(TABLES)).run_sync()
+    total_budget = float(sum(row["place_cost"] for row in rows))
+    activities_by_place = {row["place"]: json.loads(row["activities"]) for row in rows}
+    return total_budget, activities_by_place
@@ -0,0 +1,183 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import argparse
+from typing import Any
+import fsspec
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.docstore.types import DEFAULT_PERSIST_FNAME
+from llama_index.core.storage.kvstore.simple_kvstore import SimpleKVStore
+from llama_index.core.storage.kvstore.types import (
+    DEFAULT_COLLECTION,
+    BaseInMemoryKVStore,
+)
+
+DOCSTORE_FNAME = "docstore.bin"
+MAGIC = b"TGDOCS01"
+HEADER = struct.Struct("<8sQ")
+
+
+def _encode(value: dict) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob))
+
+
+class BinaryKVStore(BaseInMemoryKVStore):
+    """Key-value store persisted as one binary file with an offset index.
+
+    Layout: an 8 byte magic, the index length, a JSON index of
+    {collection: {key: [offset, length]}} and then every value as compressed
+    JSON. Opening the file only parses the index; values are read from the
+    memory-mapped file and decoded when they are requested.
+    """
+
+    def __init__(self, persist_path: str | None = None):
+        self._path = persist_path
+        self._buffer: mmap.mmap | None = None
+        self._data_start = 0
+        self._offsets: dict[str, dict[str, list[int]]] = {}
+        self._data: dict[str, dict[str, dict]] = {}
+        if persist_path is not None and os.path.exists(persist_path):
+            self._open(persist_path)
+
+    def _open(self, persist_path: str) -> None:
+        with open(persist_path, "rb") as file:
+            magic, index_length = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{persist_path} is not a binary docstore")
+            self._offsets = json.loads(file.read(index_length))
+            if os.fstat(file.fileno()).st_size > HEADER.size + index_length:
+                self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data_start = HEADER.size + index_length
+        self._data = {}
+
+    def _read(self, offset: int, length: int) -> dict:
+        start = self._data_start + offset
+        return _decode(self._buffer[start : start + length])
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self._data.setdefault(collection, {})[key] = val.copy()
+        self._offsets.get(collection, {}).pop(key, None)
+
+    async def aput(
+        self, key: str, val: dict, collection: str = DEFAULT_COLLECTION
+    ) -> None:
+        self.put(key, val, collection)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> dict | None:
+        val = self._data.get(collection, {}).get(key)
+        if val is not None:
+            return val.copy()
+        location = self._offsets.get(collection, {}).get(key)
+        if location is None:
+            return None
+        return self._read(*location)
+
+    async def aget(
+        self, key: str, collection: str = DEFAULT_COLLECTION
+    ) -> dict | None:
+        return self.get(key, collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> dict[str, dict]:
+        values = {
+            key: self._read(*location)
+            for key, location in self._offsets.get(collection, {}).items()
+        }
+        values.update(self._data.get(collection, {}))
+        return values
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> dict[str, dict]:
+        return self.get_all(collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        in_data = self._data.get(collection, {}).pop(key, None) is not None
+        in_file = self._offsets.get(collection, {}).pop(key, None) is not None
+        return in_data or in_file
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection)
+
+    def collections(self) -> set[str]:
+        return set(self._offsets) | set(self._data)
+
+    def persist(
+        self, persist_path: str, fs: fsspec.AbstractFileSystem | None = None
+    ) -> None:
+        index: dict[str, dict[str, list[int]]] = {}
+        blobs = []
+        offset = 0
+        for collection in sorted(self.collections()):
+            index[collection] = {}
+            for key, val in self.get_all(collection).items():
+                blob = _encode(val)
+                index[collection][key] = [offset, len(blob)]
+                blobs.append(blob)
+                offset += len(blob)
+        index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+
+        os.makedirs(os.path.dirname(persist_path) or ".", exist_ok=True)
+        tmp_path = f"{persist_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, len(index_bytes)))
+            file.write(index_bytes)
+            for blob in blobs:
+                file.write(blob)
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+        os.replace(tmp_path, persist_path)
+        self._path = persist_path
+        self._open(persist_path)
+
+    @classmethod
+    def from_persist_path(
+        cls, persist_path: str, fs: fsspec.AbstractFileSystem | None = None
+    ) -> "BinaryKVStore":
+        return cls(persist_path)
+
+
+class BinaryDocumentStore(KVDocumentStore):
+    """Docstore backed by BinaryKVStore, a drop-in for SimpleDocumentStore."""
+
+    def __init__(self, kvstore: BinaryKVStore | None = None, **kwargs: Any):
+        super().__init__(kvstore or BinaryKVStore(), **kwargs)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, **kwargs: Any) -> "BinaryDocumentStore":
+        return cls(BinaryKVStore(os.path.join(persist_dir, DOCSTORE_FNAME)), **kwargs)
+
+    def persist(
+        self, persist_path: str, fs: fsspec.AbstractFileSystem | None = None
+    ) -> None:
+        # StorageContext passes "<dir>/docstore.json"; the binary file is
+        # written next to it instead.
+        persist_dir = os.path.dirname(persist_path) or "."
+        self._kvstore.persist(os.path.join(persist_dir, DOCSTORE_FNAME))
+
+
+def convert_simple_docstore(store_path: str) -> BinaryDocumentStore:
+    """Writes docstore.bin for a store persisted with SimpleDocumentStore."""
+    simple_kvstore = SimpleKVStore.from_persist_path(
+        os.path.join(store_path, DEFAULT_PERSIST_FNAME)
+    )
+    kvstore = BinaryKVStore()
+    for collection, values in simple_kvstore.to_dict().items():
+        for key, val in values.items():
+            kvstore.put(key, val, collection)
+    kvstore.persist(os.path.join(store_path, DOCSTORE_FNAME))
+    return BinaryDocumentStore(kvstore)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a persisted SimpleDocumentStore into the binary format"
+    )
+    parser.add_argument("store_path")
+    args = parser.parse_args()
+    docstore = convert_simple_docstore(args.store_path)
+    print(f"converted {len(docstore.docs)} nodes in {args.store_path}")
@@ -0,0 +1,131 @@
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from ai_assistant.models import EmbeddingCacheStats
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that memoises query embeddings.
+
+    Query embeddings are kept in a bounded LRU and, when persist_path is set, in
+    a SQLite table so repeated travel guide questions skip inference across
+    restarts. Document embeddings are passed straight to the wrapped model.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _max_size: int = PrivateAttr()
+    _entries: OrderedDict = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _connection: sqlite3.Connection | None = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _persistent_hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        max_size: int = 2048,
+        persist_path: str | None = None,
+    ):
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=embed_model.callback_manager,
+        )
+        self._embed_model = embed_model
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        if persist_path is not None:
+            self._connection = sqlite3.connect(persist_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embedding "
+                "(model_name TEXT, query TEXT, embedding BLOB, "
+                "PRIMARY KEY (model_name, query))"
+            )
+            self._connection.commit()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _remember(self, key: str, embedding: Embedding) -> None:
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def _load_persisted(self, key: str) -> Embedding | None:
+        if self._connection is None:
+            return None
+        row = self._connection.execute(
+            "SELECT embedding FROM query_embedding WHERE model_name = ? AND query = ?",
+            (self.model_name, key),
+        ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def _persist(self, key: str, embedding: Embedding) -> None:
+        if self._connection is None:
+            return
+        self._connection.execute(
+            "INSERT OR REPLACE INTO query_embedding VALUES (?, ?, ?)",
+            (self.model_name, key, np.asarray(embedding, dtype=np.float32).tobytes()),
+        )
+        self._connection.commit()
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = normalize_query(query)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return embedding
+            embedding = self._load_persisted(key)
+            if embedding is not None:
+                self._persistent_hits += 1
+                self._remember(key, embedding)
+                return embedding
+            self._misses += 1
+
+        embedding = self._embed_model._get_query_embedding(query)
+        with self._lock:
+            self._remember(key, embedding)
+            self._persist(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_model._get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self._embed_model._aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return self._embed_model._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return await self._embed_model._aget_text_embeddings(texts)
+
+    def stats(self) -> EmbeddingCacheStats:
+        return EmbeddingCacheStats(
+            model_name=self.model_name,
+            size=len(self._entries),
+            max_size=self._max_size,
+            hits=self._hits,
+            persistent_hits=self._persistent_hits,
+            misses=self._misses,
+        )
@@ -0,0 +1,149 @@
+import re
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.base.response.schema import RESPONSE_TYPE, Response
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.prompts.mixin import PromptMixinType
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import QueryBundle
+from ai_assistant.models import SubQuery
+from ai_assistant.regions import DEPARTMENT_BY_CITY, find_places, normalize
+
+# Categories of the guide and the (accent-free) word stems that ask for them.
+CATEGORY_PATTERNS = {
+    "lugares para visitar": re.compile(r"\b(lugar|sitio|atracci|visit|conocer|places?\b)"),
+    "transporte": re.compile(r"\b(transport|bus(es)?\b|vuelos?\b|flights?\b|como llegar)"),
+    "actividades": re.compile(r"\b(actividad|activit|tours?\b|excursi|que hacer|things to do)"),
+    "hoteles": re.compile(r"\b(hotel|hostal|aloja|hosped|accommodation)"),
+    "restaurantes": re.compile(r"\b(restaur|comida|comer\b|gastronom|platos?\b|dining|food)"),
+}
+
+
+def find_categories(text: str) -> list[str]:
+    text = normalize(text)
+    return [category for category, pattern in CATEGORY_PATTERNS.items() if pattern.search(text)]
+
+
+def query_places(text: str) -> list[str]:
+    """Cities named in text, then the departments none of those cities belong to."""
+    cities, departments = find_places(text)
+    covered = {DEPARTMENT_BY_CITY[city] for city in cities}
+    return cities + [department for department in departments if department not in covered]
+
+
+def split_query(query: str, max_subqueries: int) -> list[SubQuery]:
+    """One sub-query per place and category the query names, in order of mention.
+
+    Queries naming at most one place and one category are not split and get
+    an empty list. Past max_subqueries, the remaining combinations are dropped.
+    """
+    places = query_places(query)
+    categories = find_categories(query)
+    if len(places) <= 1 and len(categories) <= 1:
+        return []
+    sub_queries = []
+    for place in places or [None]:
+        for category in categories or [None]:
+            if place and category:
+                scope = f"{category} en {place}"
+            else:
+                scope = place or category
+            sub_queries.append(
+                SubQuery(
+                    place=place,
+                    category=category,
+                    question=f"{query}\n\nResponde solo sobre {scope}.",
+                    # Short and naming the place, so the hybrid retriever's
+                    # fast path and the partition routing apply.
+                    retrieval_query=scope if place else f"{scope}: {query}",
+                )
+            )
+    return sub_queries[:max_subqueries]
+
+
+def merge_responses(sub_queries: list[SubQuery], responses: list[RESPONSE_TYPE]) -> Response:
+    sections = []
+    for sub_query, response in zip(sub_queries, responses):
+        title = " — ".join(part for part in (sub_query.place, sub_query.category) if part)
+        sections.append(f"## {title}\n{str(response).strip()}")
+    return Response(
+        "\n\n".join(sections),
+        source_nodes=[node for response in responses for node in response.source_nodes],
+        metadata={"sub_queries": [sub_query.model_dump() for sub_query in sub_queries]},
+    )
+
+
+class FanOutQueryEngine(BaseQueryEngine):
+    """Answers questions about several places or categories with one sub-query each.
+
+    The sub-queries retrieve and synthesize concurrently, at most
+    max_concurrency at a time, so a question about four cities takes about
+    as long as the slowest of them instead of the sum. Other questions go to
+    the wrapped query engine unchanged.
+    """
+
+    def __init__(
+        self,
+        query_engine: RetrieverQueryEngine,
+        max_concurrency: int = 4,
+        max_subqueries: int = 8,
+    ):
+        super().__init__(callback_manager=query_engine.callback_manager)
+        self._query_engine = query_engine
+        self._max_concurrency = max_concurrency
+        self._max_subqueries = max_subqueries
+
+    @property
+    def retriever(self) -> BaseRetriever:
+        return self._query_engine.retriever
+
+    def _get_prompt_modules(self) -> PromptMixinType:
+        return {"query_engine": self._query_engine}
+
+    def _run_sub_query(self, sub_query: SubQuery) -> RESPONSE_TYPE:
+        nodes = self.retriever.retrieve(sub_query.retrieval_query)
+        return self._query_engine.synthesize(QueryBundle(sub_query.question), nodes)
+
+    async def _arun_sub_query(
+        self, sub_query: SubQuery, semaphore: asyncio.Semaphore
+    ) -> RESPONSE_TYPE:
+        async with semaphore:
+            nodes = await self.retriever.aretrieve(sub_query.retrieval_query)
+            return await self._query_engine.asynthesize(QueryBundle(sub_query.question), nodes)
+
+    def _query(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        sub_queries = split_query(query_bundle.query_str, self._max_subqueries)
+        if not sub_queries:
+            return self._query_engine.query(query_bundle)
+        with self.callback_manager.event(
+            CBEventType.QUERY, payload={EventPayload.QUERY_STR: query_bundle.query_str}
+        ) as query_event:
+            with ThreadPoolExecutor(self._max_concurrency) as pool:
+                # Each thread gets a copy of the caller's context, so the
+                # sub-queries' spans land in the request's trace.
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._run_sub_query, sub_query)
+                    for sub_query in sub_queries
+                ]
+                responses = [future.result() for future in futures]
+            response = merge_responses(sub_queries, responses)
+            query_event.on_end(payload={EventPayload.RESPONSE: response})
+        return response
+
+    async def _aquery(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        sub_queries = split_query(query_bundle.query_str, self._max_subqueries)
+        if not sub_queries:
+            return await self._query_engine.aquery(query_bundle)
+        with self.callback_manager.event(
+            CBEventType.QUERY, payload={EventPayload.QUERY_STR: query_bundle.query_str}
+        ) as query_event:
+            semaphore = asyncio.Semaphore(self._max_concurrency)
+            responses = await asyncio.gather(
+                *(self._arun_sub_query(sub_query, semaphore) for sub_query in sub_queries)
+            )
+            response = merge_responses(sub_queries, list(responses))
+            query_event.on_end(payload={EventPayload.RESPONSE: response})
+        return response
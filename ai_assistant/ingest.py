@@ -0,0 +1,112 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Iterator
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode
+from ai_assistant.config import get_agent_settings
+
+SETTINGS = get_agent_settings()
+
+PROGRESS_INTERVAL = 5.0
+
+# Embedding model of the current worker process, created by _init_worker.
+_worker_model: BaseEmbedding | None = None
+
+
+def default_embed_model() -> BaseEmbedding:
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    return HuggingFaceEmbedding(
+        model_name=SETTINGS.hf_embeddings_model,
+        embed_batch_size=SETTINGS.ingest_batch_size,
+    )
+
+
+def _init_worker(factory: Callable[[], BaseEmbedding], threads: int) -> None:
+    global _worker_model
+    try:
+        import torch
+
+        # Split the cores between workers instead of every worker using all.
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = factory()
+
+
+def _embed_batch(texts: list[str]) -> list[list[float]]:
+    return _worker_model.get_text_embedding_batch(texts)
+
+
+class ParallelEmbedder:
+    """Embeds nodes in batches on a process pool with one model per worker.
+
+    Batches are yielded as soon as they are embedded, so callers can insert
+    them into the index while the rest of the corpus is still being embedded.
+    At most two batches per worker are in flight at a time.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        batch_size: int = 64,
+        factory: Callable[[], BaseEmbedding] = default_embed_model,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.factory = factory
+        self.nodes_embedded = 0
+        self.elapsed = 0.0
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes_embedded / self.elapsed if self.elapsed else 0.0
+
+    def embed(self, nodes: list[BaseNode]) -> Iterator[list[BaseNode]]:
+        batches = iter(
+            [
+                nodes[start : start + self.batch_size]
+                for start in range(0, len(nodes), self.batch_size)
+            ]
+        )
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        start = time.perf_counter()
+        last_report = start
+        # spawn, not fork: forking a process that already loaded torch can hang.
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.factory, threads),
+        ) as executor:
+            pending: dict[Future, list[BaseNode]] = {}
+
+            def submit_next() -> None:
+                batch = next(batches, None)
+                if batch is not None:
+                    texts = [
+                        node.get_content(metadata_mode=MetadataMode.EMBED)
+                        for node in batch
+                    ]
+                    pending[executor.submit(_embed_batch, texts)] = batch
+
+            for _ in range(2 * self.workers):
+                submit_next()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = pending.pop(future)
+                    for node, embedding in zip(batch, future.result()):
+                        node.embedding = embedding
+                    submit_next()
+                    self.nodes_embedded += len(batch)
+                    self.elapsed = time.perf_counter() - start
+                    if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                        last_report = time.perf_counter()
+                        print(
+                            f"Embedded {self.nodes_embedded}/{len(nodes)} nodes "
+                            f"({self.nodes_per_second:.1f} nodes/s)"
+                        )
+                    yield batch
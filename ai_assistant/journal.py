@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import argparse
+from contextlib import contextmanager
+from typing import Iterator, Literal
+
+try:
+    import fcntl
+except ImportError:  # advisory locking is only available on POSIX
+    fcntl = None
+
+FsyncPolicy = Literal["always", "interval", "never"]
+
+_last_fsync: dict[str, float] = {}
+
+
+def lock_path(file_path: str) -> str:
+    return f"{file_path}.lock"
+
+
+@contextmanager
+def file_lock(file_path: str, exclusive: bool = True) -> Iterator[None]:
+    # The lock lives in a sidecar file so that writers serialise even while the
+    # log itself is being replaced by a migration or an array rewrite.
+    with open(lock_path(file_path), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def sequence_path(file_path: str) -> str:
+    return f"{file_path}.seq"
+
+
+def read_sequence(file_path: str) -> int:
+    """Number of writes recorded in the log's sidecar, 0 before the first one."""
+    try:
+        with open(sequence_path(file_path), "r") as file:
+            return int(file.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_sequence(file_path: str) -> int:
+    """Counts a write to the log, so readers can tell it changed without reading it."""
+    with file_lock(file_path):
+        sequence = read_sequence(file_path) + 1
+        tmp_path = f"{sequence_path(file_path)}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(str(sequence))
+        os.replace(tmp_path, sequence_path(file_path))
+    return sequence
+
+
+def is_array_log(file_path: str) -> bool:
+    if not os.path.exists(file_path):
+        return False
+    with open(file_path, "rb") as file:
+        while chunk := file.read(64):
+            stripped = chunk.lstrip()
+            if stripped:
+                return stripped.startswith(b"[")
+    return False
+
+
+def _sync(file, file_path: str, fsync: FsyncPolicy, fsync_interval: float) -> None:
+    file.flush()
+    if fsync == "never":
+        return
+    now = time.monotonic()
+    if fsync == "interval" and now - _last_fsync.get(file_path, 0.0) < fsync_interval:
+        return
+    os.fsync(file.fileno())
+    _last_fsync[file_path] = now
+
+
+def _write_atomic(file_path: str, data: str) -> None:
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def _migrate_unlocked(file_path: str, dest_path: str) -> int:
+    with open(file_path, "r") as file:
+        content = file.read()
+    records = json.loads(content) if content.strip() else []
+    _write_atomic(
+        dest_path, "".join(json.dumps(record) + "\n" for record in records)
+    )
+    return len(records)
+
+
+def migrate_array_log(file_path: str, dest_path: str | None = None) -> int:
+    """Converts a JSON array log into the journal format, returns the record count."""
+    dest_path = dest_path or file_path
+    with file_lock(dest_path):
+        if not is_array_log(file_path):
+            return 0
+        return _migrate_unlocked(file_path, dest_path)
+
+
+def _truncate_torn_tail(file_path: str) -> None:
+    # Only called with the lock held, so a missing trailing newline can only be
+    # left over from a writer that crashed mid-append.
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, "r+b") as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            file.seek(start)
+            chunk = file.read(position - start)
+            if position == end and chunk.endswith(b"\n"):
+                return
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                file.truncate(start + newline + 1)
+                return
+            position = start
+        file.truncate(0)
+
+
+def append_lines(
+    file_path: str,
+    lines: list[str],
+    fsync: FsyncPolicy = "always",
+    fsync_interval: float = 1.0,
+) -> None:
+    """Appends pre-serialised JSON records to the journal, one per line."""
+    payload = "".join(line + "\n" for line in lines)
+    with file_lock(file_path):
+        if is_array_log(file_path):
+            count = _migrate_unlocked(file_path, file_path)
+            print(f"migrated {count} reservations from {file_path} to journal format")
+        else:
+            _truncate_torn_tail(file_path)
+        with open(file_path, "a") as file:
+            file.write(payload)
+            _sync(file, file_path, fsync, fsync_interval)
+
+
+def append_to_array(file_path: str, new_records: list[dict], default=None) -> None:
+    """Read-modify-write of a JSON array log, kept for the legacy format."""
+    with file_lock(file_path):
+        records = []
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            with open(file_path, "r") as file:
+                try:
+                    records = json.load(file)
+                except json.JSONDecodeError:
+                    records = []
+        records.extend(new_records)
+        _write_atomic(file_path, json.dumps(records, indent=4, default=default))
+
+
+def iter_records(file_path: str) -> Iterator[dict]:
+    """Yields the records of a log in either the array or the journal format."""
+    if is_array_log(file_path):
+        with open(file_path, "r") as file:
+            yield from json.load(file)
+        return
+
+    with open(file_path, "r") as file:
+        for line in file:
+            # A line without its newline is a write still in progress.
+            if not line.endswith("\n"):
+                break
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Migrate a JSON array trip log to the append-only journal format"
+    )
+    parser.add_argument("source")
+    parser.add_argument("dest", nargs="?")
+    args = parser.parse_args()
+    migrated = migrate_array_log(args.source, args.dest)
+    print(f"migrated {migrated} reservations")
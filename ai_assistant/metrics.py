@@ -0,0 +1,290 @@
+import time
+import bisect
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Iterator
+from ai_assistant.config import get_agent_settings
+from ai_assistant.models import RequestTrace, TraceSpan
+
+SETTINGS = get_agent_settings()
+
+METRICS_PREFIX = "travel_agent"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds. LLM round trips take seconds, log appends and cached embeddings
+# milliseconds, so the buckets span both.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        # Per label values: count of each bucket (the last one is +Inf), sum.
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[bucket] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self._series.items()
+            ]
+        for key, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                le = bound if isinstance(bound, str) else _number(bound)
+                labels = _labels(self.label_names, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics: list[Histogram | Counter] = []
+
+    def histogram(
+        self, name: str, documentation: str, label_names: tuple[str, ...] = (), **kwargs
+    ) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", documentation, label_names, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, label_names: tuple[str, ...] = ()
+    ) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", documentation, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "API request latency, until the last byte of the body is sent.",
+    ("method", "route", "status"),
+)
+EVENT_SECONDS = REGISTRY.histogram(
+    "llamaindex_event_duration_seconds",
+    "LLM calls, embeddings, travel guide retrieval and synthesis, and whole agent chats.",
+    ("event",),
+)
+TOOL_SECONDS = REGISTRY.histogram(
+    "agent_tool_duration_seconds", "Tool calls made by the agent.", ("tool",)
+)
+FUNCTION_SECONDS = REGISTRY.histogram(
+    "function_duration_seconds",
+    "Tool functions, whether the agent or a reservation endpoint calls them.",
+    ("function",),
+)
+RESERVATION_SAVE_SECONDS = REGISTRY.histogram(
+    "reservation_save_duration_seconds", "Writes of reservations to the trip log.", ("backend",)
+)
+LLM_CALLS_PER_REQUEST = REGISTRY.histogram(
+    "llm_calls_per_request",
+    "LLM round trips (ReAct steps) per API request that used the LLM.",
+    ("route",),
+    buckets=COUNT_BUCKETS,
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens sent to and generated by the LLM.", ("kind",)
+)
+TRIP_REPORTS = REGISTRY.counter(
+    "trip_reports_total",
+    "Trip report requests by outcome: generated, cached or not_modified (304).",
+    ("result",),
+)
+
+
+# The trace of the API request being served, and its perf_counter origin.
+_current_trace: ContextVar[tuple[RequestTrace, float] | None] = ContextVar(
+    "current_trace", default=None
+)
+recent_traces: deque[RequestTrace] = deque(maxlen=SETTINGS.trace_buffer_size)
+
+
+def current_trace() -> RequestTrace | None:
+    current = _current_trace.get()
+    return current[0] if current is not None else None
+
+
+def add_span(
+    kind: str,
+    name: str,
+    start: float,
+    end: float,
+    error: str | None = None,
+    prompt_tokens: int | None = None,
+    completion_tokens: int | None = None,
+) -> None:
+    """Adds a span, timed with time.perf_counter, to the current request's trace."""
+    current = _current_trace.get()
+    if current is None:
+        return
+    trace, origin = current
+    trace.spans.append(
+        TraceSpan(
+            kind=kind,
+            name=name,
+            start_ms=round((start - origin) * 1000, 3),
+            duration_ms=round((end - start) * 1000, 3),
+            error=error,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+    )
+
+
+@contextmanager
+def timed(kind: str, name: str, histogram: Histogram, **labels: str) -> Iterator[None]:
+    if not SETTINGS.tracing_enabled:
+        yield
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        end = time.perf_counter()
+        histogram.observe(end - start, **labels)
+        add_span(kind, name, start, end, error=error)
+
+
+def traced(fn: Callable) -> Callable:
+    """Times every call of a tool function, whoever makes it."""
+    if not SETTINGS.tracing_enabled:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with timed("function", fn.__name__, FUNCTION_SECONDS, function=fn.__name__):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class TracingMiddleware:
+    """Records the latency and the trace of every API request.
+
+    A plain ASGI middleware rather than an http middleware, so that streaming
+    responses are timed until their last event is sent.
+    """
+
+    def __init__(self, app, skip_prefixes: tuple[str, ...] = ("/metrics", "/health")):
+        self.app = app
+        self.skip_prefixes = skip_prefixes
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not SETTINGS.tracing_enabled:
+            await self.app(scope, receive, send)
+            return
+        trace = RequestTrace(method=scope["method"], route="", started_at=datetime.now())
+        start = time.perf_counter()
+        token = _current_trace.set((trace, start))
+
+        async def send_with_status(message) -> None:
+            if message["type"] == "http.response.start":
+                trace.status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            trace.status_code = 500
+            raise
+        finally:
+            _current_trace.reset(token)
+            route = scope.get("route")
+            # Unmatched paths are not used as labels, they are unbounded.
+            trace.route = getattr(route, "path", "unmatched")
+            trace.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            HTTP_REQUEST_SECONDS.observe(
+                trace.duration_ms / 1000,
+                method=trace.method,
+                route=trace.route,
+                status=str(trace.status_code),
+            )
+            if trace.llm_calls:
+                LLM_CALLS_PER_REQUEST.observe(trace.llm_calls, route=trace.route)
+            if not scope["path"].startswith(self.skip_prefixes):
+                recent_traces.append(trace)
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
 from enum import Enum
-from datetime import date, datetime
-from typing import List, Dict
+from datetime import date, datetime, time
+from typing import Annotated, List, Dict, Literal
 
 class TripType(str, Enum):
     flight = "FLIGHT"
@@ -41,7 +41,147 @@ class ReservationAPIResponse(BaseModel):
     message: str
     timestamp: datetime = Field(default_factory=datetime.now)
     
+class FlightBooking(BaseModel):
+    type: Literal["flight"]
+    origin: str
+    destination: str
+    travel_date: date
+
+
+class BusBooking(BaseModel):
+    type: Literal["bus"]
+    origin: str
+    destination: str
+    travel_date: date
+
+
+class HotelBooking(BaseModel):
+    type: Literal["hotel"]
+    start_date: date
+    end_date: date
+    hotel: str
+    city: str
+
+
+class RestaurantBooking(BaseModel):
+    type: Literal["restaurant"]
+    reservation_date: date
+    time: time
+    restaurant: str
+    city: str
+    dish: str = "Not specified"
+
+
+Booking = Annotated[
+    FlightBooking | BusBooking | HotelBooking | RestaurantBooking,
+    Field(discriminator="type"),
+]
+
+
+class BatchReservationRequest(BaseModel):
+    reservations: list[Booking]
+
+
+class BatchReservationItem(BaseModel):
+    index: int
+    type: str
+    status: str
+    message: str
+    cost: int | None = None
+
+
+class BatchReservationResponse(BaseModel):
+    status: str
+    saved: int
+    results: list[BatchReservationItem]
+    timestamp: datetime = Field(default_factory=datetime.now)
+
 class TripSummary(BaseModel):
     total_budget: float
     activities_by_place: Dict[str, List[Dict[str, str]]]
-    summary: str
\ No newline at end of file
+    summary: str
+
+class AgentPoolStats(BaseModel):
+    size: int
+    max_size: int
+    created: int
+    idle: int
+    in_use: int
+    utilisation: float
+    checkouts: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+    wait_seconds_p50: float
+    wait_seconds_p95: float
+
+
+class ConcurrencyStats(BaseModel):
+    limit: int
+    in_flight: int
+    waiting: int
+    rejected: int
+
+
+class ResponseCacheStats(BaseModel):
+    size: int
+    max_size: int
+    exact_hits: int
+    semantic_hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+
+
+class EmbeddingCacheStats(BaseModel):
+    model_name: str
+    size: int
+    max_size: int
+    hits: int
+    persistent_hits: int
+    misses: int
+
+
+class ReadinessStatus(BaseModel):
+    ready: bool
+    state: str
+    components: dict[str, float]
+    error: str | None = None
+
+
+class IngestStats(BaseModel):
+    files_added: int = 0
+    files_changed: int = 0
+    files_removed: int = 0
+    files_unchanged: int = 0
+    documents_added: int = 0
+    documents_deleted: int = 0
+
+
+class TraceSpan(BaseModel):
+    kind: str
+    name: str
+    start_ms: float
+    duration_ms: float
+    error: str | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+
+
+class RequestTrace(BaseModel):
+    method: str
+    route: str
+    status_code: int = 0
+    started_at: datetime
+    duration_ms: float = 0.0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    spans: List[TraceSpan] = []
+
+
+class SubQuery(BaseModel):
+    place: str | None = None
+    category: str | None = None
+    question: str
+    retrieval_query: str
@@ -0,0 +1,153 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+from llama_index.core.agent import ReActAgent
+from ai_assistant.models import AgentPoolStats, ConcurrencyStats
+
+
+class AgentPoolTimeout(Exception):
+    pass
+
+
+class ConcurrencyLimitTimeout(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight agent requests; callers queue for at most queue_timeout."""
+
+    def __init__(self, limit: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self._in_flight = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except TimeoutError:
+            self._rejected += 1
+            raise ConcurrencyLimitTimeout(
+                f"Server busy: {self.limit} requests in flight, "
+                f"waited {self.queue_timeout:.1f}s"
+            )
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> ConcurrencyStats:
+        return ConcurrencyStats(
+            limit=self.limit,
+            in_flight=self._in_flight,
+            waiting=self._waiting,
+            rejected=self._rejected,
+        )
+
+
+class AgentPool:
+    """Pre-built agents that requests check out and return instead of rebuilding."""
+
+    def __init__(
+        self,
+        factory: Callable[[], ReActAgent],
+        size: int,
+        max_size: int | None = None,
+        timeout: float = 30.0,
+        wait_window: int = 1000,
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_size = max(size, max_size or size)
+        self.timeout = timeout
+        self._idle: asyncio.Queue[ReActAgent] = asyncio.Queue()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits: deque[float] = deque(maxlen=wait_window)
+
+    async def _create(self) -> ReActAgent:
+        # Building an agent may load models on first use; keep it off the loop.
+        self._created += 1
+        try:
+            return await asyncio.to_thread(self.factory)
+        except BaseException:
+            self._created -= 1
+            raise
+
+    async def warm_up(self) -> None:
+        while self._created < self.size:
+            self._idle.put_nowait(await self._create())
+
+    def _record_wait(self, waited: float) -> None:
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._recent_waits.append(waited)
+
+    async def acquire(self) -> ReActAgent:
+        start = time.perf_counter()
+        if self._idle.empty() and self._created < self.max_size:
+            # Grow past the pre-warmed size instead of queueing, up to max_size.
+            agent = await self._create()
+        else:
+            try:
+                agent = await asyncio.wait_for(self._idle.get(), self.timeout)
+            except TimeoutError:
+                self._timeouts += 1
+                self._record_wait(time.perf_counter() - start)
+                raise AgentPoolTimeout(
+                    f"No agent available after waiting {self.timeout:.1f}s"
+                )
+        self._record_wait(time.perf_counter() - start)
+        agent.reset()
+        self._in_use += 1
+        self._checkouts += 1
+        return agent
+
+    def release(self, agent: ReActAgent) -> None:
+        self._in_use -= 1
+        self._idle.put_nowait(agent)
+
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[ReActAgent]:
+        agent = await self.acquire()
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+
+    def stats(self) -> AgentPoolStats:
+        waits = sorted(self._recent_waits)
+
+        def percentile(q: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(q * len(waits)))]
+
+        return AgentPoolStats(
+            size=self.size,
+            max_size=self.max_size,
+            created=self._created,
+            idle=self._idle.qsize(),
+            in_use=self._in_use,
+            utilisation=self._in_use / self.max_size,
+            checkouts=self._checkouts,
+            timeouts=self._timeouts,
+            wait_seconds_total=self._wait_total,
+            wait_seconds_max=self._wait_max,
+            wait_seconds_p50=percentile(0.5),
+            wait_seconds_p95=percentile(0.95),
+        )
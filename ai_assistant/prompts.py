@@ -14,6 +14,10 @@ This tool provides detailed travel information about Bolivia, offering tailored
 Provide detailed single points if the query requires a specific focus, and ensure the response is consistent in size if multiple departments are involved.
 """
 
+travel_guide_fanout_note = """
+Ask about several cities, departments or categories in a single query (for example "hoteles y restaurantes en Sucre, Potosí y Uyuni") instead of one query per city: they are answered in parallel, with one section per city and category.
+"""
+
 travel_guide_qa_str = """
 You are an expert in travel information specializing in Bolivian cities and departments. Your task is to provide tailored recommendations based on the user’s query. Answer only with supported data in your context and always respond in Spanish.
 
@@ -145,5 +149,45 @@ When responding to user queries, follow these guidelines:
 Below is the current conversation consisting of interleaving human and assistant messages.
 """
 
+chatbot_rules_str = """
+## Chat Rules
+- Utiliza la herramienta travel_guide si se requiere información.
+- Usa reserve_bus, reserve_flight, reserve_restaurant y reserve_hotel si se requiere hacer una reservación.
+- Finalmente usa trip_summary para obtener el informe y/o planificación del viaje.
+
+"""
+
+# The chatbot used to append these rules to every user message; as part of the
+# system prompt they are sent once per turn instead of once per stored message.
+chatbot_prompt_str = agent_prompt_str.replace(
+    "## Current Conversation", chatbot_rules_str + "## Current Conversation"
+)
+
+trip_report_str = """
+You are a travel assistant specialized in Bolivia. Write a detailed report of the user's trip, in Spanish, using only the trip summary and the travel guide excerpts below.
+Use Bolivianos (Bs.) to format money values and prices.
+
+Trip summary (reservations grouped by place, with dates and costs):
+---------------------
+{trip_summary}
+---------------------
+
+Travel guide excerpts for the cities of the trip:
+---------------------
+{guide_context}
+---------------------
+
+**Report structure**:
+1. **Itinerario**: every activity organized by place and date, with its cost.
+2. **Presupuesto**: the total budget and the cost of each place.
+3. **Comentarios**: for each place and activity, comments and recommendations supported by the travel guide excerpts (places, hotels, activities and restaurants).
+
+Do not invent reservations that are not in the trip summary. If there are no reservations, say so briefly.
+
+Report:
+"""
+
 travel_guide_qa_tpl = PromptTemplate(travel_guide_qa_str)
+trip_report_tpl = PromptTemplate(trip_report_str)
 agent_prompt_tpl = PromptTemplate(agent_prompt_str)
+chatbot_prompt_tpl = PromptTemplate(chatbot_prompt_str)
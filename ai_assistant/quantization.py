@@ -0,0 +1,145 @@
+import os
+import shutil
+import numpy as np
+from ai_assistant.journal import file_lock
+
+# float16 codes were dropped: without hardware half-precision support NumPy
+# decodes them slower than it scores the float32 matrix they replace.
+CODES_FNAMES = {"int8": "vectors.i8"}
+SCALES_FNAME = "vectors.i8.scales"
+CODE_DTYPES = {"int8": np.int8}
+
+CHUNK_ROWS = 1024
+
+
+def quantize(matrix: np.ndarray, kind: str) -> tuple[np.ndarray, np.ndarray]:
+    """int8 codes with one float32 scale per row."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.maximum(np.abs(matrix).max(axis=1) / 127.0, 1e-12).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+class QuantizedMatrix:
+    """Compact copy of the float32 matrix used to shortlist candidates.
+
+    The codes are stored next to vectors.f32 and mapped read-only, so an API
+    worker scanning them touches ~4x fewer pages. vectors.f32 is still needed
+    to re-score the shortlist, so the store takes more disk, not less.
+    """
+
+    def __init__(self, kind: str, codes: np.ndarray, scales: np.ndarray):
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def scores(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Approximate dot products with the query, for all rows when rows is None."""
+        n_rows = self.n_rows if rows is None else len(rows)
+        scores = np.empty(n_rows, dtype=np.float32)
+        # Decoding in chunks keeps the float32 temporaries small.
+        for start in range(0, n_rows, CHUNK_ROWS):
+            chunk = (
+                slice(start, start + CHUNK_ROWS)
+                if rows is None
+                else rows[start : start + CHUNK_ROWS]
+            )
+            chunk_scores = self.codes[chunk].astype(np.float32) @ query
+            chunk_scores *= self.scales[chunk]
+            scores[start : start + len(chunk_scores)] = chunk_scores
+        return scores
+
+    @staticmethod
+    def remove(persist_dir: str) -> None:
+        for kind in CODES_FNAMES:
+            codes_path, scales_path = _paths(persist_dir, kind)
+            if not os.path.exists(codes_path):
+                continue
+            with file_lock(codes_path):
+                for path in (codes_path, scales_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    @classmethod
+    def open(
+        cls, persist_dir: str, kind: str, n_rows: int, dim: int
+    ) -> "QuantizedMatrix | None":
+        """Maps the codes of the first n_rows rows, None if they are missing or stale.
+
+        Codes covering fewer rows are still returned, the query scores the
+        rest of the matrix exactly.
+        """
+        codes_path, scales_path = _paths(persist_dir, kind)
+        # Shared with other readers, so write() cannot swap one of the two files
+        # between the mappings below.
+        with file_lock(codes_path, exclusive=False):
+            rows = _rows_written(codes_path, scales_path, kind, dim)
+            if not rows:
+                return None
+            rows = min(rows, n_rows)
+            codes = np.memmap(codes_path, dtype=CODE_DTYPES[kind], mode="r", shape=(rows, dim))
+            scales = np.memmap(scales_path, dtype=np.float32, mode="r", shape=(rows,))
+        return cls(kind, codes, scales)
+
+    @staticmethod
+    def write(persist_dir: str, kind: str, matrix: np.ndarray) -> None:
+        """Quantizes matrix next to its float32 file.
+
+        The matrix is append-only between compactions (which remove the codes),
+        so the rows already quantized are copied and only the tail is new. The
+        files are built aside and replaced under the lock, so processes that
+        mapped the previous codes keep reading a consistent copy.
+        """
+        n_rows, dim = matrix.shape
+        codes_path, scales_path = _paths(persist_dir, kind)
+        with file_lock(codes_path):
+            existing = min(_rows_written(codes_path, scales_path, kind, dim), n_rows)
+            if existing == n_rows:
+                return
+            paths = [codes_path, scales_path]
+            row_bytes = [dim * np.dtype(CODE_DTYPES[kind]).itemsize, 4]
+            files = []
+            try:
+                for path, size in zip(paths, row_bytes):
+                    if existing:
+                        shutil.copyfile(path, f"{path}.tmp")
+                    file = open(f"{path}.tmp", "r+b" if existing else "wb")
+                    files.append(file)
+                    file.truncate(existing * size)
+                    file.seek(0, os.SEEK_END)
+                for start in range(existing, n_rows, CHUNK_ROWS):
+                    codes, scales = quantize(matrix[start : start + CHUNK_ROWS], kind)
+                    files[0].write(codes.tobytes())
+                    files[1].write(scales.tobytes())
+                for file in files:
+                    file.flush()
+                    os.fsync(file.fileno())
+            finally:
+                for file in files:
+                    file.close()
+            for path in paths:
+                os.replace(f"{path}.tmp", path)
+
+
+def _paths(persist_dir: str, kind: str) -> tuple[str, str]:
+    return os.path.join(persist_dir, CODES_FNAMES[kind]), os.path.join(persist_dir, SCALES_FNAME)
+
+
+def _rows_written(codes_path: str, scales_path: str, kind: str, dim: int) -> int:
+    """Rows in the codes on disk, 0 when missing or out of step with the scales."""
+    if not os.path.exists(codes_path):
+        return 0
+    rows, remainder = divmod(os.path.getsize(codes_path), dim * np.dtype(CODE_DTYPES[kind]).itemsize)
+    if remainder:
+        return 0
+    if not os.path.exists(scales_path) or os.path.getsize(scales_path) != rows * 4:
+        return 0
+    return rows
@@ -1,4 +1,10 @@
 import os
+import asyncio
+import time
+import hashlib
+import argparse
+import threading
+from typing import Callable
 from llama_index.core import (
     VectorStoreIndex,
     StorageContext,
@@ -7,18 +13,258 @@ from llama_index.core import (
     PromptTemplate,
     Settings,
 )
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.constants import DEFAULT_SIMILARITY_TOP_K
+from llama_index.core.indices.vector_store import VectorIndexRetriever
+from llama_index.core.ingestion import run_transformations
 from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import (
+    BaseNode,
+    Document,
+    MetadataMode,
+    NodeWithScore,
+    QueryBundle,
+)
+from llama_index.core.storage.docstore.types import BaseDocumentStore
+from llama_index.core.vector_stores.simple import (
+    DEFAULT_PERSIST_FNAME,
+    DEFAULT_VECTOR_STORE,
+    NAMESPACE_SEP,
+)
 from llama_index.core.chat_engine import ContextChatEngine
-from llama_index.llms.openai import OpenAI
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.core.llms import LLM
+from ai_assistant.bm25 import BM25Index, tokenize
+from ai_assistant.callbacks import install_tracing
 from ai_assistant.config import get_agent_settings
+from ai_assistant.embeddings import CachedEmbedding
+from ai_assistant.fanout import FanOutQueryEngine
+from ai_assistant.docstores import BinaryDocumentStore
+from ai_assistant.ingest import ParallelEmbedder
+from ai_assistant.models import IngestStats
+from ai_assistant.regions import (
+    CITIES_KEY,
+    DEPARTMENTS_KEY,
+    RegionPartitions,
+    find_places,
+)
+from ai_assistant.vector_stores import (
+    META_FNAME,
+    MemmapVectorStore,
+    convert_simple_vector_store,
+)
 
 SETTINGS = get_agent_settings()
 
-llm = OpenAI(model="gpt-4o-mini")
-embed_model = HuggingFaceEmbedding(model_name=SETTINGS.hf_embeddings_model)
-Settings.embed_model = embed_model
-Settings.llm = llm
+if SETTINGS.tracing_enabled:
+    install_tracing()
+
+FILE_HASH_KEY = "file_hash"
+
+# The LLM client and the embedding model are created on first use so that
+# importing this module (and the API) does not load torch or model weights.
+_init_lock = threading.RLock()
+_llm: LLM | None = None
+_embed_model: CachedEmbedding | None = None
+
+
+def get_llm() -> LLM:
+    global _llm
+    with _init_lock:
+        if _llm is None:
+            from llama_index.llms.openai import OpenAI
+
+            _llm = OpenAI(model="gpt-4o-mini")
+            Settings.llm = _llm
+    return _llm
+
+
+def get_embed_model() -> CachedEmbedding:
+    global _embed_model
+    with _init_lock:
+        if _embed_model is None:
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+            _embed_model = CachedEmbedding(
+                HuggingFaceEmbedding(
+                    model_name=SETTINGS.hf_embeddings_model,
+                    embed_batch_size=SETTINGS.ingest_batch_size,
+                ),
+                max_size=SETTINGS.embedding_cache_size,
+                persist_path=SETTINGS.embedding_cache_path,
+            )
+            Settings.embed_model = _embed_model
+    return _embed_model
+
+
+def is_embed_model_loaded() -> bool:
+    return _embed_model is not None
+
+
+def embed_query(text: str) -> list[float]:
+    return get_embed_model().get_query_embedding(text)
+
+
+class ThreadedRetriever(BaseRetriever):
+    """Runs a blocking retriever in a worker thread when called asynchronously.
+
+    The embedding model and the vector search are CPU bound and synchronous, so
+    awaiting them directly would stall the event loop for every request.
+    """
+
+    def __init__(self, retriever: BaseRetriever):
+        super().__init__(callback_manager=retriever.callback_manager)
+        self._retriever = retriever
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        return self._retriever._retrieve(query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        return await asyncio.to_thread(self._retriever._retrieve, query_bundle)
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses BM25 keyword matches with the dense results by reciprocal rank.
+
+    Short keyword queries ("hoteles en Sucre") whose best lexical match
+    contains every query term skip the query embedding and the dense search.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        keyword_index: BM25Index,
+        docstore: BaseDocumentStore,
+        similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+        rrf_k: int = 60,
+        fast_path_max_terms: int = 3,
+        node_ids: list[str] | None = None,
+    ):
+        super().__init__(callback_manager=vector_retriever.callback_manager)
+        self._vector_retriever = vector_retriever
+        self._node_ids = node_ids
+        self._keyword_index = keyword_index
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+        self._rrf_k = rrf_k
+        self._fast_path_max_terms = fast_path_max_terms
+        self.fast_path_hits = 0
+        self.hybrid_queries = 0
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        terms = tokenize(query_bundle.query_str)
+        keyword_hits = self._keyword_index.search(
+            terms, self._vector_retriever.similarity_top_k, self._node_ids
+        )
+        rankings = [[node_id for node_id, _, _ in keyword_hits]]
+        nodes = {}
+        if (
+            keyword_hits
+            and len(set(terms)) <= self._fast_path_max_terms
+            and keyword_hits[0][2] == 1.0
+        ):
+            self.fast_path_hits += 1
+        else:
+            self.hybrid_queries += 1
+            dense_hits = self._vector_retriever.retrieve(query_bundle)
+            rankings.append([hit.node.node_id for hit in dense_hits])
+            nodes = {hit.node.node_id: hit.node for hit in dense_hits}
+
+        fused: dict[str, float] = {}
+        for ranking in rankings:
+            for rank, node_id in enumerate(ranking, start=1):
+                fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (self._rrf_k + rank)
+        best = sorted(fused, key=fused.get, reverse=True)[: self._similarity_top_k]
+        missing = [node_id for node_id in best if node_id not in nodes]
+        if missing:
+            nodes.update(
+                (node.node_id, node) for node in self._docstore.get_nodes(missing)
+            )
+        return [NodeWithScore(node=nodes[node_id], score=fused[node_id]) for node_id in best]
+
+
+class PartitionRouter(BaseRetriever):
+    """Searches only the guide nodes of the cities or departments a query names.
+
+    Queries that name no place, or whose partition has fewer than min_nodes
+    nodes, search the whole guide.
+    """
+
+    def __init__(
+        self,
+        partitions: RegionPartitions,
+        make_retriever: Callable[[list[str] | None], BaseRetriever],
+        min_nodes: int = 1,
+    ):
+        super().__init__()
+        self._partitions = partitions
+        self._make_retriever = make_retriever
+        self._min_nodes = min_nodes
+        self._full_retriever = make_retriever(None)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        node_ids = self._partitions.route(query_bundle.query_str, self._min_nodes)
+        if node_ids is None:
+            return self._full_retriever.retrieve(query_bundle)
+        return self._make_retriever(node_ids).retrieve(query_bundle)
+
+
+def tag_regions(nodes: list[BaseNode]) -> None:
+    """Stores the cities and departments each node mentions in its metadata."""
+    for node in nodes:
+        cities, departments = find_places(node.get_content(metadata_mode=MetadataMode.NONE))
+        node.metadata[CITIES_KEY] = ", ".join(cities)
+        node.metadata[DEPARTMENTS_KEY] = ", ".join(departments)
+        for keys in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+            keys.extend(key for key in (CITIES_KEY, DEPARTMENTS_KEY) if key not in keys)
+
+
+def diff_node_ids(
+    index: VectorStoreIndex, known_ids: list[str]
+) -> tuple[list[str], list[str]]:
+    """Ids in known_ids no longer in the index, and index node ids not in known_ids."""
+    node_ids = list(index.index_struct.nodes_dict.values())
+    current = set(node_ids)
+    known = set(known_ids)
+    stale = [node_id for node_id in known_ids if node_id not in current]
+    new = [node_id for node_id in node_ids if node_id not in known]
+    return stale, new
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_data_files(data_dir: str) -> dict[str, str]:
+    """Files the directory reader would ingest, keyed by file name."""
+    return {
+        os.path.basename(file_path): str(file_path)
+        for file_path in SimpleDirectoryReader(data_dir).input_files
+    }
+
+
+def load_documents(file_paths: list[str]) -> list[Document]:
+    """Reads the files and tags every document with its file's content hash.
+
+    The hash ends up in the docstore's ref_doc_info metadata, which is what the
+    incremental ingest compares against. It is excluded from the text sent to
+    the embedding model and the LLM.
+    """
+    if not file_paths:
+        return []
+    hashes = {os.path.basename(path): file_sha256(path) for path in file_paths}
+    documents = SimpleDirectoryReader(input_files=file_paths).load_data(
+        num_workers=SETTINGS.ingest_workers or None
+    )
+    for document in documents:
+        document.metadata[FILE_HASH_KEY] = hashes[document.metadata["file_name"]]
+        document.excluded_embed_metadata_keys.append(FILE_HASH_KEY)
+        document.excluded_llm_metadata_keys.append(FILE_HASH_KEY)
+    return documents
 
 
 class TravelGuideRAG:
@@ -29,30 +275,261 @@ class TravelGuideRAG:
         qa_prompt_tpl: PromptTemplate | None = None,
     ):
         self.store_path = store_path
+        self._keyword_index: BM25Index | None = None
+        self._partitions: RegionPartitions | None = None
+        get_llm()
+        get_embed_model()
 
         if not os.path.exists(store_path) and data_dir is not None:
             self.index = self.ingest_data(store_path, data_dir)
         else:
-            self.index = load_index_from_storage(
-                StorageContext.from_defaults(persist_dir=store_path)
-            )
+            self.index = load_index_from_storage(self.load_storage_context(store_path))
+            if SETTINGS.travel_guide_incremental_ingest and data_dir is not None:
+                self.update_data(data_dir)
 
         self.qa_prompt_tpl = qa_prompt_tpl
 
+    @staticmethod
+    def memmap_vector_store(store_path: str | None = None) -> MemmapVectorStore:
+        return MemmapVectorStore(
+            persist_dir=store_path,
+            ann_index=SETTINGS.ann_index,
+            ivf_nlist=SETTINGS.ivf_nlist,
+            ivf_nprobe=SETTINGS.ivf_nprobe,
+            quantization=SETTINGS.vector_quantization,
+            rerank_factor=SETTINGS.rerank_factor,
+        )
+
+    @staticmethod
+    def load_memmap_vector_store(store_path: str) -> MemmapVectorStore:
+        """The memmap store in store_path, converted first if it was persisted by SimpleVectorStore."""
+        simple_path = os.path.join(
+            store_path, f"{DEFAULT_VECTOR_STORE}{NAMESPACE_SEP}{DEFAULT_PERSIST_FNAME}"
+        )
+        if not os.path.exists(os.path.join(store_path, META_FNAME)) and os.path.exists(
+            simple_path
+        ):
+            print(f"{store_path} has no memmap vectors, converting {simple_path}")
+            convert_simple_vector_store(store_path)
+        return TravelGuideRAG.memmap_vector_store(store_path)
+
+    @staticmethod
+    def load_storage_context(store_path: str) -> StorageContext:
+        stores = {}
+        if SETTINGS.vector_store_backend == "memmap":
+            stores["vector_store"] = TravelGuideRAG.load_memmap_vector_store(store_path)
+        if SETTINGS.docstore_backend == "binary":
+            stores["docstore"] = BinaryDocumentStore.from_persist_dir(store_path)
+        storage_context = StorageContext.from_defaults(persist_dir=store_path, **stores)
+        if "vector_store" in stores and not len(stores["vector_store"]):
+            # Retrieval would silently find nothing and the agent answer
+            # without the guide.
+            if any(
+                getattr(index_struct, "nodes_dict", None)
+                for index_struct in storage_context.index_store.index_structs()
+            ):
+                raise ValueError(
+                    f"{store_path} has indexed nodes but no embeddings in {META_FNAME}. "
+                    f"Delete it to ingest the travel guide again, or convert a "
+                    f"SimpleVectorStore with: python -m ai_assistant.vector_stores {store_path}"
+                )
+        return storage_context
+
     def ingest_data(self, store_path: str, data_dir: str) -> VectorStoreIndex:
-        documents = SimpleDirectoryReader(data_dir).load_data()
-        index = VectorStoreIndex.from_documents(documents, show_progress=True)
+        documents = load_documents(list(list_data_files(data_dir).values()))
+        stores = {}
+        if SETTINGS.vector_store_backend == "memmap":
+            stores["vector_store"] = self.memmap_vector_store()
+        if SETTINGS.docstore_backend == "binary":
+            stores["docstore"] = BinaryDocumentStore()
+        index = VectorStoreIndex(
+            [], storage_context=StorageContext.from_defaults(**stores), show_progress=True
+        )
+        self.insert_documents(index, documents)
         index.storage_context.persist(persist_dir=store_path)
+        if SETTINGS.travel_guide_retriever == "hybrid":
+            self._keyword_index = self.sync_keyword_index(index, store_path)
+        if SETTINGS.travel_guide_partitions:
+            self._partitions = self.sync_partitions(index, store_path)
         return index
 
-    def get_query_engine(self) -> RetrieverQueryEngine:
-        query_engine = self.index.as_query_engine()
+    @staticmethod
+    def insert_documents(index: VectorStoreIndex, documents: list[Document]) -> None:
+        """Splits, embeds and inserts documents, on a process pool if configured."""
+        nodes = run_transformations(documents, Settings.transformations, show_progress=True)
+        tag_regions(nodes)
+        start = time.perf_counter()
+        if SETTINGS.ingest_workers > 0:
+            embedder = ParallelEmbedder(SETTINGS.ingest_workers, SETTINGS.ingest_batch_size)
+            for batch in embedder.embed(nodes):
+                index.insert_nodes(batch)
+        else:
+            index.insert_nodes(nodes)
+        for document in documents:
+            index.docstore.set_document_hash(document.doc_id, document.hash)
+        elapsed = time.perf_counter() - start
+        if nodes:
+            print(
+                f"Embedded {len(nodes)} nodes in {elapsed:.1f}s "
+                f"({len(nodes) / max(elapsed, 1e-9):.1f} nodes/s)"
+            )
+
+    def update_data(self, data_dir: str) -> IngestStats:
+        """Re-ingests only the files in data_dir that are new or changed.
+
+        Files are matched to their stored documents by file name and compared
+        by content hash; documents of changed and removed files are deleted.
+        Only the affected documents are embedded, and the memmap vector store
+        persists the new rows by appending to its matrix.
+        """
+        stored_files: dict[str, list[str]] = {}
+        stored_metadata: dict[str, dict] = {}
+        for ref_doc_id, ref_doc_info in self.index.ref_doc_info.items():
+            file_name = ref_doc_info.metadata.get("file_name")
+            stored_files.setdefault(file_name, []).append(ref_doc_id)
+            stored_metadata[file_name] = ref_doc_info.metadata
+
+        stats = IngestStats()
+        to_load = []
+        to_delete = []
+        for file_name, file_path in list_data_files(data_dir).items():
+            if file_name not in stored_files:
+                stats.files_added += 1
+                to_load.append(file_path)
+                continue
+            # Documents ingested before hashes were recorded count as changed,
+            # so they are re-ingested once and get their hash.
+            if stored_metadata[file_name].get(FILE_HASH_KEY) == file_sha256(file_path):
+                stats.files_unchanged += 1
+            else:
+                stats.files_changed += 1
+                to_load.append(file_path)
+                to_delete.extend(stored_files[file_name])
+            del stored_files[file_name]
+        for ref_doc_ids in stored_files.values():
+            stats.files_removed += 1
+            to_delete.extend(ref_doc_ids)
+
+        for ref_doc_id in to_delete:
+            self.index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+        documents = load_documents(to_load)
+        if documents:
+            self.insert_documents(self.index, documents)
+        stats.documents_deleted = len(to_delete)
+        stats.documents_added = len(documents)
+
+        if to_delete or documents:
+            self.index.storage_context.persist(persist_dir=self.store_path)
+        if SETTINGS.travel_guide_retriever == "hybrid":
+            self._keyword_index = self.sync_keyword_index(self.index, self.store_path)
+        if SETTINGS.travel_guide_partitions:
+            self._partitions = self.sync_partitions(self.index, self.store_path)
+        print(f"Travel guide ingest: {stats}")
+        return stats
+
+    @staticmethod
+    def sync_keyword_index(index: VectorStoreIndex, store_path: str) -> BM25Index:
+        """Loads the keyword index of the store, indexing nodes it is missing."""
+        if BM25Index.exists(store_path):
+            keyword_index = BM25Index.load(store_path)
+        else:
+            keyword_index = BM25Index.build([])
+        stale, new = diff_node_ids(index, keyword_index.node_ids)
+        if stale:
+            keyword_index.remove(stale)
+        if new:
+            keyword_index.add(
+                (node.node_id, node.get_content(metadata_mode=MetadataMode.NONE))
+                for node in index.docstore.get_nodes(new)
+            )
+        if stale or new:
+            keyword_index.save(store_path)
+        return keyword_index
+
+    def keyword_index(self) -> BM25Index:
+        if self._keyword_index is None:
+            self._keyword_index = self.sync_keyword_index(self.index, self.store_path)
+        return self._keyword_index
+
+    @staticmethod
+    def sync_partitions(index: VectorStoreIndex, store_path: str) -> RegionPartitions:
+        """Loads the city and department partitions, adding the nodes they miss.
+
+        Nodes tagged at ingest keep their tags; nodes of stores ingested before
+        tagging existed are tagged from their text.
+        """
+        if RegionPartitions.exists(store_path):
+            partitions = RegionPartitions.load(store_path)
+        else:
+            partitions = RegionPartitions()
+        stale, new = diff_node_ids(index, partitions.node_ids)
+        if stale:
+            partitions.remove(stale)
+        for node in index.docstore.get_nodes(new):
+            if CITIES_KEY in node.metadata:
+                cities = [c for c in node.metadata[CITIES_KEY].split(", ") if c]
+                departments = [d for d in node.metadata[DEPARTMENTS_KEY].split(", ") if d]
+            else:
+                cities, departments = find_places(
+                    node.get_content(metadata_mode=MetadataMode.NONE)
+                )
+            partitions.add(node.node_id, cities, departments)
+        if stale or new:
+            partitions.save(store_path)
+        return partitions
+
+    def partitions(self) -> RegionPartitions:
+        if self._partitions is None:
+            self._partitions = self.sync_partitions(self.index, self.store_path)
+        return self._partitions
+
+    def get_retriever(self, similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K) -> BaseRetriever:
+        def make_retriever(node_ids: list[str] | None) -> BaseRetriever:
+            # Not index.as_retriever(): it passes every node id of the index,
+            # which makes each full search a filtered scan of the vector store
+            # that cannot use the IVF index or the quantized matrix.
+            if SETTINGS.travel_guide_retriever != "hybrid":
+                return VectorIndexRetriever(
+                    self.index, similarity_top_k=similarity_top_k, node_ids=node_ids
+                )
+            return HybridRetriever(
+                VectorIndexRetriever(
+                    self.index,
+                    similarity_top_k=max(similarity_top_k, SETTINGS.hybrid_candidates),
+                    node_ids=node_ids,
+                ),
+                self.keyword_index(),
+                self.index.docstore,
+                similarity_top_k=similarity_top_k,
+                rrf_k=SETTINGS.hybrid_rrf_k,
+                fast_path_max_terms=SETTINGS.keyword_fast_path_max_terms,
+                node_ids=node_ids,
+            )
+
+        if not SETTINGS.travel_guide_partitions:
+            return make_retriever(None)
+        return PartitionRouter(
+            self.partitions(),
+            make_retriever,
+            min_nodes=max(similarity_top_k, SETTINGS.partition_min_nodes),
+        )
+
+    def get_query_engine(self) -> BaseQueryEngine:
+        # aquery already awaits the LLM with the default compact synthesizer;
+        # use_async only matters for modes that make several LLM calls.
+        query_engine = RetrieverQueryEngine.from_args(ThreadedRetriever(self.get_retriever()))
 
         if self.qa_prompt_tpl is not None:
             query_engine.update_prompts(
                 {"response_synthesizer:text_qa_template": self.qa_prompt_tpl}
             )
 
+        if SETTINGS.travel_guide_fanout:
+            return FanOutQueryEngine(
+                query_engine,
+                max_concurrency=SETTINGS.fanout_max_concurrency,
+                max_subqueries=SETTINGS.fanout_max_subqueries,
+            )
         return query_engine
     
     def get_chat_engine(self) -> ContextChatEngine:
@@ -62,4 +539,17 @@ class TravelGuideRAG:
                 {"response_synthesizer:text_qa_template": self.qa_prompt_tpl}
             )
             
-        return chat_engine
\ No newline at end of file
+        return chat_engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Embed new or changed travel guide files into the store"
+    )
+    parser.add_argument("--store-path", default=SETTINGS.travel_guide_store_path)
+    parser.add_argument("--data-dir", default=SETTINGS.travel_guide_data_path)
+    args = parser.parse_args()
+    if os.path.exists(args.store_path):
+        TravelGuideRAG(args.store_path).update_data(args.data_dir)
+    else:
+        TravelGuideRAG(args.store_path, args.data_dir)
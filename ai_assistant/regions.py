@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import unicodedata
+from typing import Iterable
+
+PARTITIONS_FNAME = "partitions.json"
+
+CITIES_KEY = "cities"
+DEPARTMENTS_KEY = "departments"
+
+# Towns the guide covers, by department. Names that are also common words or
+# repeated across departments (Concepción, Candelaria, San Lorenzo) are left
+# out, a wrong tag is worse than a missing one.
+CITIES_BY_DEPARTMENT = {
+    "La Paz": [
+        "La Paz", "El Alto", "Copacabana", "Isla del Sol", "Coroico", "Sorata",
+        "Tiwanaku", "Chulumani", "Apolo",
+    ],
+    "Cochabamba": ["Cochabamba", "Quillacollo", "Villa Tunari", "Mizque", "Aiquile"],
+    "Santa Cruz": [
+        "Santa Cruz", "Samaipata", "Vallegrande", "La Higuera", "San Ignacio de Velasco",
+        "San José de Chiquitos", "Roboré", "Puerto Suárez", "Camiri",
+    ],
+    "Oruro": ["Oruro", "Sajama", "Curahuara de Carangas"],
+    "Potosí": ["Potosí", "Uyuni", "Tupiza", "Villazón", "Torotoro"],
+    "Chuquisaca": ["Sucre", "Tarabuco", "Padilla", "Monteagudo"],
+    "Tarija": ["Tarija", "Yacuiba", "Villamontes", "Bermejo", "Padcaya"],
+    "Beni": ["Trinidad", "Rurrenabaque", "Riberalta", "Guayaramerín", "San Borja"],
+    "Pando": ["Cobija"],
+}
+
+ALIASES = {
+    "Tiwanaku": ["Tiahuanaco", "Tiahuanacu"],
+    "Uyuni": ["Salar de Uyuni"],
+    "Torotoro": ["Toro Toro"],
+    "Santa Cruz": ["Santa Cruz de la Sierra"],
+}
+
+DEPARTMENT_BY_CITY = {
+    city: department
+    for department, cities in CITIES_BY_DEPARTMENT.items()
+    for city in cities
+}
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def _pattern(names: Iterable[str]) -> re.Pattern:
+    # Longest names first, so "santa cruz de la sierra" wins over "santa cruz".
+    names = sorted({normalize(name) for name in names}, key=len, reverse=True)
+    return re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b")
+
+
+_CITY_BY_NAME = {
+    normalize(alias): city
+    for city in DEPARTMENT_BY_CITY
+    for alias in [city, *ALIASES.get(city, [])]
+}
+_CITY_RE = _pattern(_CITY_BY_NAME)
+_DEPARTMENT_BY_NAME = {normalize(department): department for department in CITIES_BY_DEPARTMENT}
+_DEPARTMENT_RE = _pattern(_DEPARTMENT_BY_NAME)
+
+
+def find_places(text: str) -> tuple[list[str], list[str]]:
+    """Cities and departments named in text, each in order of first mention.
+
+    A city also tags its department. Department names that are also a city
+    (La Paz, Santa Cruz, Potosí, ...) count as the city.
+    """
+    text = normalize(text)
+    cities = list(dict.fromkeys(_CITY_BY_NAME[name] for name in _CITY_RE.findall(text)))
+    departments = [DEPARTMENT_BY_CITY[city] for city in cities]
+    departments += [_DEPARTMENT_BY_NAME[name] for name in _DEPARTMENT_RE.findall(text)]
+    return cities, list(dict.fromkeys(departments))
+
+
+class RegionPartitions:
+    """Node ids of the travel guide grouped by the cities and departments they mention.
+
+    Retrieval for a city-scoped query only searches the nodes of that city
+    (or of its department, when the city has too few).
+    """
+
+    def __init__(
+        self,
+        cities: dict[str, list[str]] | None = None,
+        departments: dict[str, list[str]] | None = None,
+        node_ids: list[str] | None = None,
+    ):
+        self.cities = cities or {}
+        self.departments = departments or {}
+        # Every node seen, tagged or not, so that syncing knows what is new.
+        self.node_ids = node_ids or []
+
+    def add(self, node_id: str, cities: list[str], departments: list[str]) -> None:
+        self.node_ids.append(node_id)
+        for city in cities:
+            self.cities.setdefault(city, []).append(node_id)
+        for department in departments:
+            self.departments.setdefault(department, []).append(node_id)
+
+    def remove(self, node_ids: Iterable[str]) -> None:
+        removed = set(node_ids)
+        self.node_ids = [node_id for node_id in self.node_ids if node_id not in removed]
+        for partitions in (self.cities, self.departments):
+            for name, members in list(partitions.items()):
+                members = [node_id for node_id in members if node_id not in removed]
+                if members:
+                    partitions[name] = members
+                else:
+                    del partitions[name]
+
+    def route(self, query: str, min_nodes: int = 1) -> list[str] | None:
+        """Node ids to search for the query, or None to search the whole guide."""
+        cities, departments = find_places(query)
+        for partitions, names in ((self.cities, cities), (self.departments, departments)):
+            if not names:
+                continue
+            node_ids = list(
+                dict.fromkeys(
+                    node_id for name in names for node_id in partitions.get(name, [])
+                )
+            )
+            if len(node_ids) >= min_nodes:
+                return node_ids
+        return None
+
+    def save(self, persist_dir: str) -> None:
+        path = os.path.join(persist_dir, PARTITIONS_FNAME)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(
+                {
+                    "cities": self.cities,
+                    "departments": self.departments,
+                    "node_ids": self.node_ids,
+                },
+                file,
+            )
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, PARTITIONS_FNAME))
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "RegionPartitions":
+        with open(os.path.join(persist_dir, PARTITIONS_FNAME), "r") as file:
+            data = json.load(file)
+        return cls(data["cities"], data["departments"], data["node_ids"])
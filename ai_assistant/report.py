@@ -0,0 +1,138 @@
+import asyncio
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import MetadataMode
+from ai_assistant.config import get_agent_settings
+from ai_assistant.metrics import TRIP_REPORTS
+from ai_assistant.models import TripSummary
+from ai_assistant.prompts import trip_report_tpl
+from ai_assistant.rags import get_llm
+from ai_assistant.regions import find_places
+from ai_assistant.tools import get_travel_guide_tool, read_trip_summary
+
+SETTINGS = get_agent_settings()
+
+NO_GUIDE_CONTEXT = "No travel guide excerpts."
+
+
+def trip_cities(summary: TripSummary) -> list[str]:
+    """Cities of the trip in order of first appearance, at most trip_report_max_cities."""
+    cities, _ = find_places(" | ".join(summary.activities_by_place))
+    return cities[: SETTINGS.trip_report_max_cities]
+
+
+def guide_query(city: str) -> str:
+    return f"{city}: lugares para visitar, hoteles, restaurantes y actividades"
+
+
+async def fetch_city_context(retriever: BaseRetriever, city: str) -> str:
+    nodes = await retriever.aretrieve(guide_query(city))
+    texts = [
+        node.node.get_content(metadata_mode=MetadataMode.LLM)
+        for node in nodes[: SETTINGS.trip_report_guide_nodes]
+    ]
+    return f"## {city}\n" + "\n\n".join(texts)
+
+
+async def prefetch_guide_context(cities: list[str]) -> str:
+    """Travel guide excerpts for every city, retrieved concurrently and without the LLM."""
+    if not cities:
+        return NO_GUIDE_CONTEXT
+    tool = await asyncio.to_thread(get_travel_guide_tool)
+    retriever = tool.query_engine.retriever
+    sections = await asyncio.gather(*(fetch_city_context(retriever, city) for city in cities))
+    return "\n\n".join(sections)
+
+
+async def trip_report_inputs() -> dict[str, str]:
+    summary = await asyncio.to_thread(read_trip_summary)
+    guide_context = NO_GUIDE_CONTEXT
+    if SETTINGS.trip_report_guide_context:
+        guide_context = await prefetch_guide_context(trip_cities(summary))
+    return {
+        "trip_summary": summary.model_dump_json(indent=2),
+        "guide_context": guide_context,
+    }
+
+
+async def direct_trip_report() -> str:
+    """The trip report in a single LLM call, instead of a ReAct loop deciding to
+    call trip_summary and then reading its output.
+
+    Raises FileNotFoundError when there is no trip log.
+    """
+    inputs = await trip_report_inputs()
+    return await get_llm().apredict(trip_report_tpl, **inputs)
+
+
+async def stream_direct_trip_report() -> AsyncIterator[str]:
+    inputs = await trip_report_inputs()
+    async for token in await get_llm().astream(trip_report_tpl, **inputs):
+        yield token
+
+
+def make_etag(version: str) -> str:
+    return f'"{SETTINGS.trip_report_mode}-{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
+
+
+class TripReportCache:
+    """The latest report of each trip and the ETag of the log version it describes.
+
+    Requests for a version being generated wait for it instead of calling the
+    LLM again. Past max_size trips, the least recently requested are dropped.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries: OrderedDict[str | None, tuple[str, str]] = OrderedDict()
+        self._pending: dict[tuple[str | None, str], asyncio.Task] = {}
+
+    def get(self, trip_id: str | None, etag: str) -> str | None:
+        entry = self._entries.get(trip_id)
+        if not SETTINGS.trip_report_cache or entry is None or entry[0] != etag:
+            return None
+        self._entries.move_to_end(trip_id)
+        return entry[1]
+
+    def put(self, trip_id: str | None, etag: str, report: str) -> None:
+        if not SETTINGS.trip_report_cache:
+            return
+        self._entries[trip_id] = (etag, report)
+        self._entries.move_to_end(trip_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_generate(
+        self, trip_id: str | None, etag: str, generate: Callable[[], Awaitable[str]]
+    ) -> str:
+        report = self.get(trip_id, etag)
+        if report is not None:
+            TRIP_REPORTS.inc(result="cached")
+            return report
+        key = (trip_id, etag)
+        task = self._pending.get(key)
+        if task is None:
+
+            async def run() -> str:
+                report = await generate()
+                self.put(trip_id, etag, report)
+                TRIP_REPORTS.inc(result="generated")
+                return report
+
+            task = self._pending[key] = asyncio.create_task(run())
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            TRIP_REPORTS.inc(result="cached")
+        # Shielded, so a client that disconnects does not cancel the report
+        # other requests are waiting for.
+        return await asyncio.shield(task)
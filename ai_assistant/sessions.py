@@ -0,0 +1,76 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable
+from llama_index.core.agent import ReActAgent
+from llama_index.core.memory import BaseMemory, ChatMemoryBuffer, ChatSummaryMemoryBuffer
+from ai_assistant.config import get_agent_settings
+from ai_assistant.rags import get_llm
+
+SETTINGS = get_agent_settings()
+
+
+def build_chat_memory() -> BaseMemory:
+    """Chat memory that keeps each prompt within chat_memory_token_limit.
+
+    The buffer drops the oldest turns once the limit is reached; the summary
+    memory asks the LLM to condense them into a summary message instead.
+    """
+    if SETTINGS.chat_memory == "summary":
+        return ChatSummaryMemoryBuffer.from_defaults(
+            llm=get_llm(), token_limit=SETTINGS.chat_memory_token_limit
+        )
+    return ChatMemoryBuffer.from_defaults(token_limit=SETTINGS.chat_memory_token_limit)
+
+
+class SessionAgents:
+    """One agent per chat session, so conversations do not share memory.
+
+    Sessions idle for longer than ttl seconds are dropped, and when more than
+    max_sessions are open the least recently used one is evicted.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], ReActAgent],
+        max_sessions: int = 100,
+        ttl: float = 1800.0,
+    ):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._agents: OrderedDict[str, tuple[ReActAgent, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def get(self, session_id: str) -> ReActAgent:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            if session_id in self._agents:
+                agent, _ = self._agents.pop(session_id)
+            else:
+                agent = None
+        if agent is None:
+            # Built outside the lock, other sessions keep chatting meanwhile.
+            agent = self.factory()
+            self.created += 1
+        with self._lock:
+            self._agents[session_id] = (agent, now)
+            while len(self._agents) > self.max_sessions:
+                self._agents.popitem(last=False)
+                self.evicted += 1
+        return agent
+
+    def _evict_idle(self, now: float) -> None:
+        # Entries are in least recently used order, so idle ones come first.
+        while self._agents:
+            _, last_used = next(iter(self._agents.values()))
+            if now - last_used <= self.ttl:
+                break
+            self._agents.popitem(last=False)
+            self.evicted += 1
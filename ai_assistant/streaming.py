@@ -0,0 +1,50 @@
+import json
+from typing import AsyncIterator
+from llama_index.core.agent import ReActAgent
+from llama_index.core.agent.react.types import (
+    ActionReasoningStep,
+    ObservationReasoningStep,
+)
+from llama_index.core.chat_engine.types import StreamingAgentChatResponse
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_agent_events(
+    agent: ReActAgent, message: str
+) -> AsyncIterator[tuple[str, dict]]:
+    """Runs the ReAct loop step by step, yielding tool events and then answer tokens."""
+    task = agent.create_task(message)
+    reported = 0
+    while True:
+        step_output = await agent.astream_step(task.task_id)
+        current_reasoning = task.extra_state["current_reasoning"]
+        for reasoning_step in current_reasoning[reported:]:
+            if isinstance(reasoning_step, ActionReasoningStep):
+                yield "tool_call", {
+                    "thought": reasoning_step.thought,
+                    "tool": reasoning_step.action,
+                    "input": reasoning_step.action_input,
+                }
+            elif isinstance(reasoning_step, ObservationReasoningStep):
+                yield "tool_result", {"observation": reasoning_step.observation}
+        reported = len(current_reasoning)
+        if step_output.is_last:
+            break
+
+    response = agent.finalize_response(task.task_id, step_output)
+    if isinstance(response, StreamingAgentChatResponse):
+        first = True
+        async for token in response.async_response_gen():
+            if first:
+                # The chunk that completed the "Answer:" marker is replayed as is.
+                token = token.split("Answer:", 1)[-1].lstrip()
+                first = False
+            if token:
+                yield "token", {"text": token}
+    else:
+        yield "token", {"text": response.response}
+    yield "done", {}
+
@@ -0,0 +1,206 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Iterable
+from ai_assistant.config import get_agent_settings
+from ai_assistant.models import TripSummary
+from ai_assistant.journal import is_array_log
+
+SETTINGS = get_agent_settings()
+
+FINGERPRINT_SIZE = 64
+
+
+def describe_reservation(item: dict) -> tuple[str, str, str] | None:
+    reservation_type = item.get("reservation_type")
+    trip_type = item.get("trip_type")
+    if reservation_type == "TripReservation":
+        place = f"{item['departure']} to {item['destination']}"
+        activity_date = item["date"]
+        description = f"{trip_type} from {item['departure']} to {item['destination']}"
+    elif reservation_type == "HotelReservation":
+        place = item["city"]
+        activity_date = item["checkin_date"]
+        description = f"Hotel stay at {item['hotel_name']} from {item['checkin_date']} to {item['checkout_date']}"
+    elif reservation_type == "RestaurantReservation":
+        place = item["city"]
+        activity_date = item["reservation_time"]
+        description = f"Restaurant reservation at {item['restaurant']} at {item['reservation_time']}. Dish: {item['dish']}"
+    else:
+        return None
+    return place, activity_date, description
+
+
+def summarize_records(
+    trip_data: Iterable[dict],
+    total_budget: float = 0.0,
+    activities_by_place: dict[str, list[dict[str, str]]] | None = None,
+) -> tuple[float, dict[str, list[dict[str, str]]]]:
+    """Folds reservations into a running total and per-place activity lists."""
+    if activities_by_place is None:
+        activities_by_place = {}
+
+    for item in trip_data:
+        described = describe_reservation(item)
+        if described is None:
+            continue
+        place, activity_date, description = described
+
+        cost = float(item["cost"])
+        total_budget += cost
+
+        if place not in activities_by_place:
+            activities_by_place[place] = []
+
+        activities_by_place[place].append(
+            {
+                "date": activity_date,
+                "description": description,
+                "cost": f"${cost:.2f}",
+            }
+        )
+
+    return total_budget, activities_by_place
+
+
+def sort_activities(
+    activities_by_place: dict[str, list[dict[str, str]]],
+) -> dict[str, list[dict[str, str]]]:
+    """Places by name and their activities by date, the order the SQLite summary uses."""
+    return {
+        place: sorted(
+            activities_by_place[place],
+            key=lambda activity: (
+                activity["date"],
+                activity["description"],
+                float(activity["cost"].lstrip("$")),
+            ),
+        )
+        for place in sorted(activities_by_place)
+    }
+
+
+def build_trip_summary(
+    total_budget: float, activities_by_place: dict[str, list[dict[str, str]]]
+) -> TripSummary:
+    summary = f"Total budget: ${total_budget:.2f}. The trip includes activities in the following places: "
+    summary += ", ".join(activities_by_place.keys()) + "."
+
+    return TripSummary(
+        total_budget=total_budget,
+        activities_by_place=activities_by_place,
+        summary=summary,
+    )
+
+
+class LogSummaryState:
+    """Running summary of a trip log plus the file identity it was computed from."""
+
+    def __init__(self):
+        self.identity: tuple[int, int] | None = None
+        self.offset = 0
+        self.mtime_ns = 0
+        self.fingerprint = b""
+        self.array_format = False
+        self.total_budget = 0.0
+        self.activities_by_place: dict[str, list[dict[str, str]]] = {}
+        # Built from the fold above on the first read after it changes.
+        self.summary: TripSummary | None = None
+
+    def is_current(self, stat: os.stat_result) -> bool:
+        return (
+            self.identity == (stat.st_dev, stat.st_ino)
+            and stat.st_size == self.offset
+            and stat.st_mtime_ns == self.mtime_ns
+        )
+
+    def can_extend(self, file, stat: os.stat_result) -> bool:
+        # Appends keep the inode and only grow the file; anything else (rotation,
+        # truncation, in-place rewrite, array format) forces a rebuild.
+        if self.array_format or self.identity != (stat.st_dev, stat.st_ino):
+            return False
+        if stat.st_size < self.offset:
+            return False
+        start = max(0, self.offset - FINGERPRINT_SIZE)
+        file.seek(start)
+        return file.read(self.offset - start) == self.fingerprint
+
+    def update(
+        self, file, stat: os.stat_result, offset: int, array_format: bool
+    ) -> None:
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.offset = offset
+        self.mtime_ns = stat.st_mtime_ns
+        self.array_format = array_format
+        self.summary = None
+        start = max(0, offset - FINGERPRINT_SIZE)
+        file.seek(start)
+        self.fingerprint = file.read(offset - start)
+
+
+# One state per trip log, the least recently summarized are dropped first.
+_summary_states: OrderedDict[str, LogSummaryState] = OrderedDict()
+_summary_lock = threading.Lock()
+
+
+def _read_journal_tail(file, offset: int) -> tuple[list[dict], int]:
+    file.seek(offset)
+    data = file.read()
+    # Leave a partially written last line for the next call.
+    end = data.rfind(b"\n") + 1
+    records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return records, offset + end
+
+
+def _rebuild(file, path: str, stat: os.stat_result) -> LogSummaryState:
+    array_format = is_array_log(path)
+    if array_format:
+        # can_extend may have read the fingerprint of a previous journal.
+        file.seek(0)
+        records = json.loads(file.read())
+        offset = stat.st_size
+    else:
+        records, offset = _read_journal_tail(file, 0)
+    state = LogSummaryState()
+    state.total_budget, state.activities_by_place = summarize_records(records)
+    state.update(file, stat, offset, array_format)
+    return state
+
+
+def summarize_log(file_path: str) -> TripSummary:
+    """Summarizes a trip log, folding in only the records appended since the last call.
+
+    While the log is unchanged the same TripSummary is returned, callers must
+    not modify it.
+    """
+    path = os.path.abspath(file_path)
+    with _summary_lock:
+        state = _summary_states.get(path)
+        try:
+            with open(path, "rb") as file:
+                stat = os.fstat(file.fileno())
+                if state is None or not state.is_current(stat):
+                    if state is not None and state.can_extend(file, stat):
+                        records, offset = _read_journal_tail(file, state.offset)
+                        state.total_budget, state.activities_by_place = (
+                            summarize_records(
+                                records, state.total_budget, state.activities_by_place
+                            )
+                        )
+                        state.update(file, stat, offset, array_format=False)
+                    else:
+                        state = _summary_states[path] = _rebuild(file, path, stat)
+            _summary_states.move_to_end(path)
+            while len(_summary_states) > SETTINGS.trip_summary_cache_size:
+                _summary_states.popitem(last=False)
+        except Exception:
+            # A failed fold may have left the state half updated.
+            _summary_states.pop(path, None)
+            raise
+
+        if state.summary is None:
+            state.summary = build_trip_summary(
+                state.total_budget, sort_activities(state.activities_by_place)
+            )
+        return state.summary
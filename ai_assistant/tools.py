@@ -1,10 +1,18 @@
 import json
+import asyncio
+import threading
 from random import randint
 from datetime import date, datetime
+from typing import Callable
 from llama_index.core.tools import QueryEngineTool, FunctionTool, ToolMetadata
 from ai_assistant.rags import TravelGuideRAG
-from ai_assistant.prompts import travel_guide_qa_tpl, travel_guide_description
+from ai_assistant.prompts import (
+    travel_guide_qa_tpl,
+    travel_guide_description,
+    travel_guide_fanout_note,
+)
 from ai_assistant.config import get_agent_settings
+from ai_assistant.metrics import traced
 from ai_assistant.models import (
     TripReservation,
     TripType,
@@ -12,23 +20,104 @@ from ai_assistant.models import (
     RestaurantReservation,
     TripSummary,
 )
+from ai_assistant.summary import build_trip_summary, summarize_log
+from ai_assistant.trips import current_trip_id, trip_log_file
 from ai_assistant.utils import save_reservation
 
 SETTINGS = get_agent_settings()
 
-travel_guide_tool = QueryEngineTool(
-    query_engine=TravelGuideRAG(
-        store_path=SETTINGS.travel_guide_store_path,
-        data_dir=SETTINGS.travel_guide_data_path,
-        qa_prompt_tpl=travel_guide_qa_tpl,
-    ).get_query_engine(),
-    metadata=ToolMetadata(
-        name="travel_guide", description=travel_guide_description, return_direct=False
-    ),
-)
+_travel_guide_lock = threading.Lock()
+_travel_guide_tool: QueryEngineTool | None = None
+
+
+def get_travel_guide_tool() -> QueryEngineTool:
+    """Loads the travel guide index on first use; later calls reuse it."""
+    global _travel_guide_tool
+    with _travel_guide_lock:
+        if _travel_guide_tool is None:
+            _travel_guide_tool = QueryEngineTool(
+                query_engine=TravelGuideRAG(
+                    store_path=SETTINGS.travel_guide_store_path,
+                    data_dir=SETTINGS.travel_guide_data_path,
+                    qa_prompt_tpl=travel_guide_qa_tpl,
+                ).get_query_engine(),
+                metadata=ToolMetadata(
+                    name="travel_guide",
+                    description=travel_guide_description
+                    + (travel_guide_fanout_note if SETTINGS.travel_guide_fanout else ""),
+                    return_direct=False,
+                ),
+            )
+    return _travel_guide_tool
+
+
+def function_tool(fn: Callable) -> FunctionTool:
+    """A tool that the agent's async calls run with asyncio.to_thread.
+
+    FunctionTool's default executor call drops the caller's contextvars, which
+    would leave the function's spans out of the request's trace.
+    """
+
+    async def async_fn(*args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    return FunctionTool.from_defaults(fn=fn, async_fn=async_fn, return_direct=False)
+
+
+# Reservation builders, shared by the tools and the batch reservation endpoint
+def build_flight_reservation(
+    date_str: str, departure: str, destination: str
+) -> TripReservation:
+    return TripReservation(
+        trip_type=TripType.flight,
+        departure=departure,
+        destination=destination,
+        date=date.fromisoformat(date_str),
+        cost=randint(200, 700),
+    )
+
+
+def build_bus_reservation(
+    date_str: str, departure: str, destination: str
+) -> TripReservation:
+    return TripReservation(
+        trip_type=TripType.bus,
+        departure=departure,
+        destination=destination,
+        date=date.fromisoformat(date_str),
+        cost=randint(50, 200),
+    )
+
+
+def build_hotel_reservation(
+    checkin_date_str: str, checkout_date_str: str, hotel_name: str, city: str
+) -> HotelReservation:
+    return HotelReservation(
+        checkin_date=date.fromisoformat(checkin_date_str),
+        checkout_date=date.fromisoformat(checkout_date_str),
+        hotel_name=hotel_name,
+        city=city,
+        cost=randint(100, 1000),
+    )
+
+
+def build_restaurant_reservation(
+    reservation_datetime_str: str,
+    restaurant: str,
+    city: str,
+    dish: str = "Not specified",
+) -> RestaurantReservation:
+    return RestaurantReservation(
+        reservation_time=datetime.fromisoformat(reservation_datetime_str),
+        restaurant=restaurant,
+        city=city,
+        dish=dish,
+        cost=randint(20, 100),
+    )
 
 
 # Tool functions
+@traced
 def reserve_flight(date_str: str, departure: str, destination: str) -> TripReservation:
     """
     Reserves a flight given the departure and destination locations and a date in ISO format (YYYY-MM-DD).
@@ -44,21 +133,16 @@ def reserve_flight(date_str: str, departure: str, destination: str) -> TripReser
     print(
         f"Making flight reservation from {departure} to {destination} on date: {date}"
     )
-    reservation = TripReservation(
-        trip_type=TripType.flight,
-        departure=departure,
-        destination=destination,
-        date=date.fromisoformat(date_str),
-        cost=randint(200, 700),
-    )
+    reservation = build_flight_reservation(date_str, departure, destination)
 
     save_reservation(reservation)
     return reservation
 
 
-flight_tool = FunctionTool.from_defaults(fn=reserve_flight, return_direct=False)
+flight_tool = function_tool(reserve_flight)
 
 
+@traced
 def reserve_bus(date_str: str, departure: str, destination: str) -> TripReservation:
     """
     Reserves a bus ticket given the departure and destination locations and a date in ISO format (YYYY-MM-DD).
@@ -74,21 +158,16 @@ def reserve_bus(date_str: str, departure: str, destination: str) -> TripReservat
     print(
         f"Making bus reservation from {departure} to {destination} on date: {date_str}"
     )
-    reservation = TripReservation(
-        trip_type=TripType.bus,
-        departure=departure,
-        destination=destination,
-        date=date.fromisoformat(date_str),
-        cost=randint(50, 200),
-    )
+    reservation = build_bus_reservation(date_str, departure, destination)
 
     save_reservation(reservation)
     return reservation
 
 
-bus_tool = FunctionTool.from_defaults(fn=reserve_bus, return_direct=False)
+bus_tool = function_tool(reserve_bus)
 
 
+@traced
 def reserve_hotel(
     checkin_date_str: str, checkout_date_str: str, hotel_name: str, city: str
 ) -> HotelReservation:
@@ -107,21 +186,18 @@ def reserve_hotel(
     print(
         f"Making hotel reservation at {hotel_name} in {city} from {checkin_date_str} to {checkout_date_str}"
     )
-    reservation = HotelReservation(
-        checkin_date=date.fromisoformat(checkin_date_str),
-        checkout_date=date.fromisoformat(checkout_date_str),
-        hotel_name=hotel_name,
-        city=city,
-        cost=randint(100, 1000),
+    reservation = build_hotel_reservation(
+        checkin_date_str, checkout_date_str, hotel_name, city
     )
 
     save_reservation(reservation)
     return reservation
 
 
-hotel_tool = FunctionTool.from_defaults(fn=reserve_hotel, return_direct=False)
+hotel_tool = function_tool(reserve_hotel)
 
 
+@traced
 def reserve_restaurant(
     reservation_datetime_str: str,
     restaurant: str,
@@ -140,99 +216,44 @@ def reserve_restaurant(
     Returns:
     - A RestaurantReservation object with the details of the reservation.
     """
-    reservation_datetime = datetime.fromisoformat(reservation_datetime_str)
-    print(
-        f"Making restaurant reservation at {restaurant} in {city} on {reservation_datetime} with preferred dish: {dish}"
+    reservation = build_restaurant_reservation(
+        reservation_datetime_str, restaurant, city, dish
     )
-    reservation = RestaurantReservation(
-        reservation_time=reservation_datetime,
-        restaurant=restaurant,
-        city=city,
-        dish=dish,
-        cost=randint(20, 100),
+    print(
+        f"Making restaurant reservation at {restaurant} in {city} on {reservation.reservation_time} with preferred dish: {dish}"
     )
 
     save_reservation(reservation)
     return reservation
 
 
-restaurant_tool = FunctionTool.from_defaults(fn=reserve_restaurant, return_direct=False)
+restaurant_tool = function_tool(reserve_restaurant)
+
+
+@traced
+def read_trip_summary(file_path: str | None = None) -> TripSummary:
+    """The trip summary of the current trip's reservations; raises FileNotFoundError
+    when the trip has no log."""
+    if SETTINGS.reservation_backend == "sqlite":
+        from ai_assistant.db import summarize_reservations
+
+        return build_trip_summary(*summarize_reservations(current_trip_id()))
+    return summarize_log(file_path or trip_log_file())
 
 
-def trip_summary(file_path: str = "trip.json") -> TripSummary:
+@traced
+def trip_summary() -> TripSummary:
     """
-    Summarizes the content of the log file, organizing saved activities by place and date,
+    Summarizes the reservations of the current trip, organizing saved activities by place and date,
     calculating the total budget, and providing comments on each place and activity, giving all the details in final description.
     MANDATORY: Do not memoize these information it can change during the requests.
     IMPORTANT: Erase information to update in the next query.
-    Parameters:
-    - file_path: Path to the trip.json file containing trip activities and details. There is a path by default.
 
     Returns:
     - A TripSummary object with organized activities, total budget, and comments.
     """
     try:
-        with open(file_path, "r") as file:
-            trip_data = json.load(file)
-
-        total_budget = 0.0
-        activities_by_place = {}
-
-        # Process each reservation and organize data
-        for item in trip_data:
-            reservation_type = item.get("reservation_type")
-            trip_type = item.get("trip_type")
-            if reservation_type == "TripReservation":
-                place = f"{item['departure']} to {item['destination']}"
-                activity_date = item["date"]
-                description = (
-                    f"{trip_type} from {item['departure']} to {item['destination']}"
-                )
-            elif reservation_type == "HotelReservation":
-                place = item["city"]
-                activity_date = item["checkin_date"]
-                description = f"Hotel stay at {item['hotel_name']} from {item['checkin_date']} to {item['checkout_date']}"
-            elif reservation_type == "RestaurantReservation":
-                place = item["city"]
-                activity_date = item["reservation_time"]
-                description = f"Restaurant reservation at {item['restaurant']} at {item['reservation_time']}. Dish: {item['dish']}"
-            else:
-                continue
-
-            cost = float(item["cost"])
-            total_budget += cost
-
-            if place not in activities_by_place:
-                activities_by_place[place] = []
-
-            activities_by_place[place].append(
-                {
-                    "date": activity_date,
-                    "description": description,
-                    "cost": f"${cost:.2f}",
-                }
-            )
-
-        # Convert activities into a prompt-friendly format for the agent
-        activities_text = ""
-        for place, activities in activities_by_place.items():
-            activities_text += f"Place: {place}\n"
-            for activity in activities:
-                activities_text += (
-                    f"  Date: {activity['date']}, "
-                    f"Description: {activity['description']}, "
-                    f"Cost: {activity['cost']}.\n"
-                )
-
-        # Generate summary
-        summary = f"Total budget: ${total_budget:.2f}. The trip includes activities in the following places: "
-        summary += ", ".join(activities_by_place.keys()) + "."
-
-        return TripSummary(
-            total_budget=total_budget,
-            activities_by_place=activities_by_place,
-            summary=summary,
-        )
+        return read_trip_summary()
 
     except FileNotFoundError:
         raise Exception("Trip log file not found")
@@ -244,4 +265,4 @@ def trip_summary(file_path: str = "trip.json") -> TripSummary:
         raise Exception(f"An error occurred while summarizing the trip: {str(e)}")
 
 
-trip_summary_tool = FunctionTool.from_defaults(fn=trip_summary, return_direct=False)
+trip_summary_tool = function_tool(trip_summary)
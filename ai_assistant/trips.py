@@ -0,0 +1,60 @@
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+from ai_assistant.config import get_agent_settings
+
+SETTINGS = get_agent_settings()
+
+TRIP_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+_TRIP_ID_RE = re.compile(TRIP_ID_PATTERN)
+
+# The trip whose reservations are being written or summarized. The reservation
+# functions and tools read it, so the endpoints and the chatbot only have to set it
+# around the call (contextvars follow asyncio tasks and asyncio.to_thread).
+_current_trip_id: ContextVar[str | None] = ContextVar("current_trip_id", default=None)
+
+
+def current_trip_id() -> str | None:
+    return _current_trip_id.get()
+
+
+def check_trip_id(trip_id: str) -> str:
+    # Trip ids become file names, so nothing that could leave trip_logs_dir.
+    if not _TRIP_ID_RE.match(trip_id):
+        raise ValueError(f"Invalid trip id: {trip_id!r}")
+    return trip_id
+
+
+@contextmanager
+def trip_scope(trip_id: str | None) -> Iterator[None]:
+    """Scopes the reservations saved and summarized inside the block to a trip.
+
+    Without a trip id they go to the shared log_file, as before trips existed.
+    """
+    token = _current_trip_id.set(None if trip_id is None else check_trip_id(trip_id))
+    try:
+        yield
+    finally:
+        _current_trip_id.reset(token)
+
+
+def trip_log_file(trip_id: str | None = None) -> str:
+    """The log of the current trip, one file per trip under trip_logs_dir."""
+    trip_id = trip_id or current_trip_id()
+    if trip_id is None:
+        return SETTINGS.log_file
+    extension = "jsonl" if SETTINGS.log_format == "jsonl" else "json"
+    return os.path.join(SETTINGS.trip_logs_dir, f"{trip_id}.{extension}")
+
+
+def trip_sequence_file(trip_id: str | None = None) -> str:
+    """The file whose sidecars count the writes to the current trip's reservations."""
+    trip_id = trip_id or current_trip_id()
+    if SETTINGS.reservation_backend != "sqlite":
+        return trip_log_file(trip_id)
+    if trip_id is None:
+        return SETTINGS.sqlite_path
+    # SQLite keeps every trip in one database, the sequence is still per trip.
+    return os.path.join(SETTINGS.trip_logs_dir, f"{trip_id}.sqlite")
@@ -1,6 +1,7 @@
 import os
 import json
 from datetime import date, datetime
+from typing import Iterator
 from ai_assistant.models import (
     RestaurantReservation,
     TripReservation,
@@ -8,6 +9,15 @@ from ai_assistant.models import (
     TripType,
 )
 from ai_assistant.config import get_agent_settings
+from ai_assistant.journal import (
+    append_lines,
+    append_to_array,
+    bump_sequence,
+    iter_records,
+    read_sequence,
+)
+from ai_assistant.metrics import RESERVATION_SAVE_SECONDS, timed
+from ai_assistant.trips import current_trip_id, trip_log_file, trip_sequence_file
 
 SETTINGS = get_agent_settings()
 
@@ -18,24 +28,75 @@ def custom_serializer(obj):
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
 
-def save_reservation(
-    reservation: RestaurantReservation | TripReservation | HotelReservation,
-):
-    reservation_dict = reservation.model_dump()
-    print(f"saving reservation: {reservation_dict}")
-    reservations = []
-    if os.path.exists(SETTINGS.log_file) and os.path.getsize(SETTINGS.log_file) > 0:
-        with open(SETTINGS.log_file, "r") as file:
-            try:
-                reservations = json.load(file)
-            except json.JSONDecodeError:
-                reservation = []
+Reservation = RestaurantReservation | TripReservation | HotelReservation
+
+
+def save_reservation(reservation: Reservation):
+    save_reservations([reservation])
+
+
+def save_reservations(reservations: list[Reservation]):
+    """Persists the reservations in a single write: all of them or none.
+
+    They go to the log of the current trip (see trips.trip_scope), so writes
+    for different trips never wait on the same file lock.
+    """
+    if not reservations:
+        return
+    reservation_dicts = []
+    for reservation in reservations:
+        reservation_dict = reservation.model_dump()
+        print(f"saving reservation: {reservation_dict}")
+        reservation_dict["reservation_type"] = reservation.__class__.__name__
+        reservation_dicts.append(reservation_dict)
+
+    if SETTINGS.reservation_backend == "sqlite":
+        backend = "sqlite"
     else:
-        reservations = []
-    reservation_dict["reservation_type"] = reservation.__class__.__name__
-    reservations.append(reservation_dict)
+        backend = SETTINGS.log_format
+    log_file = trip_log_file()
+    if current_trip_id() is not None:
+        os.makedirs(SETTINGS.trip_logs_dir, exist_ok=True)
+    with timed("save", "save_reservations", RESERVATION_SAVE_SECONDS, backend=backend):
+        if backend == "sqlite":
+            from ai_assistant.db import insert_reservations
+
+            insert_reservations(reservations, current_trip_id())
+        elif backend == "jsonl":
+            append_lines(
+                log_file,
+                [
+                    json.dumps(reservation_dict, default=custom_serializer)
+                    for reservation_dict in reservation_dicts
+                ],
+                fsync=SETTINGS.log_fsync,
+                fsync_interval=SETTINGS.log_fsync_interval,
+            )
+        else:
+            append_to_array(log_file, reservation_dicts, default=custom_serializer)
+        # After the write: a reader that sees the new sequence also sees the records.
+        bump_sequence(trip_sequence_file())
+
+    print(f"saved {len(reservations)} reservation(s)!")
+
+
+def trip_log_version() -> str:
+    """Changes whenever the current trip's reservations are saved, without a read of the log.
+
+    The write sequence counts saves through save_reservations; the size and
+    modification time of the log also catch edits made by hand. Raises
+    FileNotFoundError when there is no log.
+    """
+    sequence = read_sequence(trip_sequence_file())
+    if SETTINGS.reservation_backend == "sqlite":
+        return f"sqlite-{sequence}"
+    stat = os.stat(trip_log_file())
+    return f"{sequence}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
 
-    with open(SETTINGS.log_file, "w") as file:
-        json.dump(reservations, file, indent=4, default=custom_serializer)
+def load_reservations(file_path: str | None = None) -> Iterator[dict]:
+    if file_path is None and SETTINGS.reservation_backend == "sqlite":
+        from ai_assistant.db import iter_reservations
 
-    print(f"saved reservation!")
+        return iter_reservations(current_trip_id())
+    return iter_records(file_path or trip_log_file())
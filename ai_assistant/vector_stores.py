@@ -0,0 +1,415 @@
+import os
+import json
+import argparse
+from typing import Any, Sequence
+import numpy as np
+import fsspec
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from ai_assistant.ann import IVFIndex
+from ai_assistant.quantization import QuantizedMatrix
+
+MATRIX_FNAME = "vectors.f32"
+META_FNAME = "vectors.json"
+# Deleted rows stay in the matrix as tombstones until they exceed this share.
+COMPACT_RATIO = 0.25
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class MemmapVectorStore(BasePydanticVectorStore):
+    """Vector store persisted as one contiguous float32 matrix opened with np.memmap.
+
+    Rows are L2-normalised when written, so cosine similarity is a single
+    matrix-vector product. The matrix file is mapped read-only, which lets
+    every API worker share the same page-cached copy.
+
+    With ann_index="ivf" an IVF index is (re)built on persist and queries only
+    score the rows of the ivf_nprobe closest lists.
+
+    With quantization="int8" candidates are scored on a compact copy of the
+    matrix and only the best similarity_top_k * rerank_factor are re-scored in
+    float32. The copy lowers the memory a query touches, not the disk used:
+    vectors.f32 is kept for the re-scoring.
+    """
+
+    stores_text: bool = False
+    persist_dir: str | None = None
+    ann_index: str = "none"
+    ivf_nlist: int = 0
+    ivf_nprobe: int = 8
+    quantization: str = "none"
+    rerank_factor: int = 4
+
+    _matrix: np.ndarray = PrivateAttr()
+    _ids: list[str] = PrivateAttr()
+    _ref_doc_ids: list[str | None] = PrivateAttr()
+    _row_by_id: dict[str, int] = PrivateAttr()
+    _active: np.ndarray = PrivateAttr()
+    _pending: list[np.ndarray] = PrivateAttr()
+    _persisted_rows: int = PrivateAttr()
+    _dim: int | None = PrivateAttr()
+    _ivf: IVFIndex | None = PrivateAttr()
+    _quantized: QuantizedMatrix | None = PrivateAttr()
+
+    def __init__(self, persist_dir: str | None = None, **kwargs: Any):
+        super().__init__(persist_dir=persist_dir, **kwargs)
+        self._ivf = None
+        self._quantized = None
+        self._ids = []
+        self._ref_doc_ids = []
+        self._row_by_id = {}
+        self._pending = []
+        self._dim = None
+        self._persisted_rows = 0
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._active = np.empty(0, dtype=bool)
+        if persist_dir is not None and os.path.exists(
+            os.path.join(persist_dir, META_FNAME)
+        ):
+            self._load(persist_dir)
+            if self.quantization != "none" and self._persisted_rows and self._quantized is None:
+                print(
+                    f"No {self.quantization} codes in {persist_dir}, scoring in float32. "
+                    f"Run: python -m ai_assistant.vector_stores {persist_dir} "
+                    f"--quantization {self.quantization}"
+                )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MemmapVectorStore"
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, **kwargs: Any) -> "MemmapVectorStore":
+        return cls(persist_dir=persist_dir, **kwargs)
+
+    @property
+    def client(self) -> None:
+        return None
+
+    def _load(self, persist_dir: str) -> None:
+        with open(os.path.join(persist_dir, META_FNAME), "r") as file:
+            meta = json.load(file)
+        self._dim = meta["dim"]
+        self._ids = meta["ids"]
+        self._ref_doc_ids = meta["ref_doc_ids"]
+        self._persisted_rows = len(self._ids)
+        self._active = np.ones(len(self._ids), dtype=bool)
+        self._active[meta.get("deleted", [])] = False
+        self._row_by_id = {
+            node_id: row
+            for row, node_id in enumerate(self._ids)
+            if self._active[row]
+        }
+        if self._persisted_rows:
+            self._matrix = np.memmap(
+                os.path.join(persist_dir, MATRIX_FNAME),
+                dtype=np.float32,
+                mode="r",
+                shape=(self._persisted_rows, self._dim),
+            )
+        else:
+            self._matrix = np.empty((0, self._dim or 0), dtype=np.float32)
+        self._quantized = None
+        if self.quantization != "none" and self._persisted_rows:
+            # Read-only: the codes are written by persist and the converter, a
+            # store loaded without them scores in float32.
+            self._quantized = QuantizedMatrix.open(
+                persist_dir, self.quantization, self._persisted_rows, self._dim
+            )
+        self._ivf = None
+        if self.ann_index == "ivf" and IVFIndex.exists(persist_dir):
+            self._ivf = IVFIndex.load(persist_dir)
+            if self._ivf.n_rows > self._persisted_rows:
+                # Built before rows were removed, row numbers no longer match.
+                self._ivf = None
+
+    def build_ann_index(self, nlist: int = 0) -> IVFIndex:
+        return IVFIndex.build(self._full_matrix(), nlist)
+
+    def __len__(self) -> int:
+        return int(self._active.sum())
+
+    def __bool__(self) -> bool:
+        # StorageContext.from_defaults tests "if vector_store:", which would
+        # otherwise replace an empty store with a SimpleVectorStore.
+        return True
+
+    def add(self, nodes: Sequence[BaseNode], **kwargs: Any) -> list[str]:
+        if not nodes:
+            return []
+        embeddings = np.asarray(
+            [node.get_embedding() for node in nodes], dtype=np.float32
+        )
+        if self._dim is None:
+            self._dim = embeddings.shape[1]
+            self._matrix = np.empty((0, self._dim), dtype=np.float32)
+        self._pending.append(_normalize_rows(embeddings))
+        for node in nodes:
+            self._row_by_id[node.node_id] = len(self._ids)
+            self._ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id)
+        self._active = np.concatenate([self._active, np.ones(len(nodes), dtype=bool)])
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        for row, row_ref_doc_id in enumerate(self._ref_doc_ids):
+            if row_ref_doc_id == ref_doc_id and self._active[row]:
+                self._active[row] = False
+                self._row_by_id.pop(self._ids[row], None)
+
+    def _full_matrix(self) -> np.ndarray:
+        if not self._pending:
+            return self._matrix
+        self._matrix = np.concatenate([np.asarray(self._matrix), *self._pending])
+        self._pending = []
+        return self._matrix
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+        if query.filters is not None:
+            raise ValueError("Metadata filters are not supported by MemmapVectorStore")
+        if self._dim is None or query.query_embedding is None:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        matrix = self._full_matrix()
+        query_vector = np.array(query.query_embedding, dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+
+        if query.node_ids is not None:
+            rows = np.fromiter(
+                (
+                    self._row_by_id[node_id]
+                    for node_id in query.node_ids
+                    if node_id in self._row_by_id
+                ),
+                dtype=np.int64,
+            )
+        elif self._ivf is not None:
+            # Rows appended after the index was built are always scanned.
+            rows = np.concatenate(
+                [
+                    self._ivf.candidate_rows(query_vector, self.ivf_nprobe),
+                    np.arange(self._ivf.n_rows, len(self._ids)),
+                ]
+            )
+        else:
+            rows = None
+
+        if self._quantized is not None:
+            # Shortlist on the compact codes; the shortlist is re-scored below.
+            candidate_rows = np.arange(len(self._ids)) if rows is None else rows
+            scores = self._approximate_scores(rows, query_vector)
+            scores[~self._active[candidate_rows]] = -np.inf
+            shortlist = top_k(scores, query.similarity_top_k * self.rerank_factor)
+            rows = candidate_rows[shortlist[np.isfinite(scores[shortlist])]]
+            scores = self._read_rows(rows) @ query_vector
+        elif rows is None:
+            scores = matrix @ query_vector
+            scores[~self._active] = -np.inf
+        else:
+            scores = matrix[rows] @ query_vector
+            scores[~self._active[rows]] = -np.inf
+
+        best = top_k(scores, query.similarity_top_k)
+        best = best[np.isfinite(scores[best])]
+        best_rows = best if rows is None else rows[best]
+        return VectorStoreQueryResult(
+            similarities=scores[best].tolist(),
+            ids=[self._ids[row] for row in best_rows],
+        )
+
+    def _read_rows(self, rows: np.ndarray) -> np.ndarray:
+        if not isinstance(self._matrix, np.memmap):
+            return self._matrix[rows]
+        # Indexing the memmap would fault in whole folios of neighbouring rows,
+        # so the float32 matrix never becomes resident when only re-ranking.
+        row_bytes = self._dim * self._matrix.itemsize
+        with open(self._matrix.filename, "rb") as file:
+            buffer = b"".join(
+                os.pread(file.fileno(), row_bytes, int(row) * row_bytes) for row in rows
+            )
+        return np.frombuffer(buffer, dtype=np.float32).reshape(len(rows), self._dim)
+
+    def _approximate_scores(
+        self, rows: np.ndarray | None, query_vector: np.ndarray
+    ) -> np.ndarray:
+        # Rows added since the last persist have no codes yet and are scored
+        # exactly.
+        n_quantized = self._quantized.n_rows
+        if rows is None:
+            return np.concatenate(
+                [
+                    self._quantized.scores(query_vector),
+                    self._full_matrix()[n_quantized:] @ query_vector,
+                ]
+            )
+        scores = np.empty(len(rows), dtype=np.float32)
+        quantized = rows < n_quantized
+        scores[quantized] = self._quantized.scores(query_vector, rows[quantized])
+        scores[~quantized] = self._full_matrix()[rows[~quantized]] @ query_vector
+        return scores
+
+    def persist(
+        self, persist_path: str, fs: fsspec.AbstractFileSystem | None = None
+    ) -> None:
+        # StorageContext passes "<dir>/default__vector_store.json"; the matrix
+        # and its metadata are written next to it instead.
+        persist_dir = os.path.dirname(persist_path) or "."
+        os.makedirs(persist_dir, exist_ok=True)
+        matrix_path = os.path.join(persist_dir, MATRIX_FNAME)
+        same_dir = self.persist_dir is not None and os.path.abspath(
+            self.persist_dir
+        ) == os.path.abspath(persist_dir)
+
+        tombstones = int((~self._active).sum())
+        if (
+            same_dir
+            and self._persisted_rows
+            and tombstones <= COMPACT_RATIO * len(self._ids)
+        ):
+            # Append the rows added since the last persist; deletions are only
+            # recorded in the metadata.
+            new_rows = self._full_matrix()[self._persisted_rows :]
+            with open(matrix_path, "r+b") as file:
+                # Rows a crashed persist appended without its metadata would
+                # shift every later row away from its id in vectors.json.
+                file.truncate(self._persisted_rows * self._dim * 4)
+                file.seek(0, os.SEEK_END)
+                file.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+        else:
+            matrix = self._full_matrix()[self._active]
+            self._ids = [node_id for node_id, a in zip(self._ids, self._active) if a]
+            self._ref_doc_ids = [
+                ref for ref, a in zip(self._ref_doc_ids, self._active) if a
+            ]
+            self._active = np.ones(len(self._ids), dtype=bool)
+            # Row numbers change, so the codes go before the matrix they were
+            # built from: codes on disk are always a prefix of vectors.f32.
+            QuantizedMatrix.remove(persist_dir)
+            tmp_path = f"{matrix_path}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, matrix_path)
+            # Row numbers changed, an older IVF index no longer applies.
+            IVFIndex.remove(persist_dir)
+
+        meta_path = os.path.join(persist_dir, META_FNAME)
+        with open(f"{meta_path}.tmp", "w") as file:
+            json.dump(
+                {
+                    "dim": self._dim,
+                    "ids": self._ids,
+                    "ref_doc_ids": self._ref_doc_ids,
+                    "deleted": np.flatnonzero(~self._active).tolist(),
+                },
+                file,
+            )
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+        self.persist_dir = persist_dir
+        self._load(persist_dir)
+        if self.quantization != "none" and self._persisted_rows:
+            QuantizedMatrix.write(persist_dir, self.quantization, self._matrix)
+            self._quantized = QuantizedMatrix.open(
+                persist_dir, self.quantization, self._persisted_rows, self._dim
+            )
+        if self.ann_index == "ivf" and len(self._ids):
+            self._ivf = self.build_ann_index(self.ivf_nlist)
+            self._ivf.save(persist_dir)
+
+
+def write_matrix_store(
+    store_path: str,
+    node_ids: list[str],
+    matrix: np.ndarray,
+    ref_doc_ids: list[str | None] | None = None,
+) -> None:
+    """Writes the memmap files for the given embeddings, normalising the rows."""
+    matrix = _normalize_rows(np.asarray(matrix, dtype=np.float32))
+    with open(os.path.join(store_path, MATRIX_FNAME), "wb") as file:
+        file.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+    with open(os.path.join(store_path, META_FNAME), "w") as file:
+        json.dump(
+            {
+                "dim": int(matrix.shape[1]) if len(node_ids) else None,
+                "ids": node_ids,
+                "ref_doc_ids": ref_doc_ids or [None] * len(node_ids),
+            },
+            file,
+        )
+
+
+def quantize_store(store_path: str, quantization: str) -> MemmapVectorStore:
+    """Writes the quantized codes of a memmap store, for stores persisted without them.
+
+    The codes are stored in addition to vectors.f32: queries touch less memory,
+    the store takes more disk.
+    """
+    store = MemmapVectorStore.from_persist_dir(store_path)
+    if len(store._ids):
+        QuantizedMatrix.write(store_path, quantization, store._matrix)
+    return MemmapVectorStore.from_persist_dir(store_path, quantization=quantization)
+
+
+def convert_simple_vector_store(store_path: str) -> MemmapVectorStore:
+    """Writes the memmap files for a store persisted with SimpleVectorStore."""
+    simple_store = SimpleVectorStore.from_persist_dir(store_path)
+    data = simple_store.data
+    node_ids = list(data.embedding_dict.keys())
+    write_matrix_store(
+        store_path,
+        node_ids,
+        [data.embedding_dict[node_id] for node_id in node_ids],
+        [data.text_id_to_ref_doc_id.get(node_id) for node_id in node_ids],
+    )
+    return MemmapVectorStore.from_persist_dir(store_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a persisted SimpleVectorStore into the memmap format"
+    )
+    parser.add_argument("store_path")
+    parser.add_argument(
+        "--quantization",
+        choices=["int8"],
+        help="also write the quantized codes; on a memmap store, only write them. "
+        "They lower the RSS of queries but add to the disk used, vectors.f32 is kept",
+    )
+    args = parser.parse_args()
+    if args.quantization and os.path.exists(os.path.join(args.store_path, META_FNAME)):
+        store = quantize_store(args.store_path, args.quantization)
+        print(f"quantized {len(store)} embeddings in {args.store_path} to {args.quantization}")
+    else:
+        store = convert_simple_vector_store(args.store_path)
+        print(f"converted {len(store)} embeddings in {args.store_path}")
+        if args.quantization:
+            store = quantize_store(args.store_path, args.quantization)
+            print(f"quantized them to {args.quantization}")
@@ -0,0 +1,52 @@
+import time
+import asyncio
+from typing import Awaitable, Callable
+from ai_assistant.models import ReadinessStatus
+
+
+class Warmup:
+    """Loads heavy components in a background task after the API has started.
+
+    Steps run in order; the time each one took is reported by status() so the
+    readiness endpoint shows what is already loaded.
+    """
+
+    def __init__(self, steps: list[tuple[str, Callable[[], Awaitable[object]]]]):
+        self.steps = steps
+        self.state = "pending"
+        self.components: dict[str, float] = {}
+        self.error: str | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        self.state = "warming"
+        for name, step in self.steps:
+            start = time.perf_counter()
+            try:
+                await step()
+            except Exception as e:
+                print(f"Warm-up step {name} failed: {e}")
+                self.state = "failed"
+                self.error = f"{name}: {e}"
+                return
+            self.components[name] = round(time.perf_counter() - start, 3)
+        self.state = "ready"
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> ReadinessStatus:
+        return ReadinessStatus(
+            ready=self.state == "ready",
+            state=self.state,
+            components=self.components,
+            error=self.error,
+        )
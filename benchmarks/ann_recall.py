@@ -0,0 +1,87 @@
+import time
+import argparse
+import numpy as np
+from ai_assistant.ann import IVFIndex
+from ai_assistant.vector_stores import MemmapVectorStore, _normalize_rows, top_k
+
+
+def synthetic_matrix(n_rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    # Clustered data is closer to real embeddings than uniform noise.
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=n_rows)
+    points = centers[labels] + 0.5 * rng.standard_normal((n_rows, dim)).astype(np.float32)
+    return _normalize_rows(points).astype(np.float32)
+
+
+def sample_queries(matrix: np.ndarray, n_queries: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    rows = np.asarray(matrix[rng.choice(len(matrix), n_queries, replace=False)])
+    noisy = rows + 0.1 * rng.standard_normal(rows.shape).astype(np.float32)
+    return _normalize_rows(noisy).astype(np.float32)
+
+
+def exact_search(matrix: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    return top_k(matrix @ query, k)
+
+
+def ivf_search(
+    matrix: np.ndarray, index: IVFIndex, query: np.ndarray, k: int, nprobe: int
+) -> np.ndarray:
+    rows = index.candidate_rows(query, nprobe)
+    return rows[top_k(matrix[rows] @ query, k)]
+
+
+def timed(search, queries: np.ndarray) -> tuple[list[np.ndarray], float]:
+    start = time.perf_counter()
+    results = [search(query) for query in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Recall@k and latency of the IVF index against exact search"
+    )
+    parser.add_argument("--store", help="memmap store to benchmark instead of synthetic data")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.store:
+        matrix = np.asarray(MemmapVectorStore.from_persist_dir(args.store)._full_matrix())
+    else:
+        matrix = synthetic_matrix(args.rows, args.dim, args.clusters, args.seed)
+    queries = sample_queries(matrix, min(args.queries, len(matrix)), args.seed)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(matrix, args.nlist, seed=args.seed)
+    build_seconds = time.perf_counter() - start
+    print(
+        f"{len(matrix)} rows x {matrix.shape[1]} dims, {index.nlist} lists, "
+        f"built in {build_seconds:.2f}s"
+    )
+
+    truth, exact_ms = timed(lambda query: exact_search(matrix, query, args.k), queries)
+    print(f"{'search':>12} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speedup':>8}")
+    print(f"{'exact':>12} {1.0:>10.3f} {exact_ms:>10.3f} {1.0:>8.1f}")
+    for nprobe in args.nprobe:
+        found, ivf_ms = timed(
+            lambda query: ivf_search(matrix, index, query, args.k, nprobe), queries
+        )
+        recall = np.mean(
+            [len(np.intersect1d(a, b)) / len(a) for a, b in zip(truth, found)]
+        )
+        print(
+            f"{'nprobe=' + str(nprobe):>12} {recall:>10.3f} {ivf_ms:>10.3f} "
+            f"{exact_ms / ivf_ms:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import time
+import random
+import argparse
+import statistics
+import tracemalloc
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.index_store import SimpleIndexStore
+from ai_assistant.docstores import DOCSTORE_FNAME, BinaryDocumentStore
+
+
+def load_store(store_path: str, backend: str):
+    if backend == "binary":
+        docstore = BinaryDocumentStore.from_persist_dir(store_path)
+    else:
+        docstore = SimpleDocumentStore.from_persist_dir(store_path)
+    index_store = SimpleIndexStore.from_persist_dir(store_path)
+    return docstore, index_store
+
+
+def measure(store_path: str, backend: str, k: int, seed: int) -> tuple[float, float, float]:
+    """Returns load ms, ms to fetch k nodes and MB allocated by the load."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    docstore, index_store = load_store(store_path, backend)
+    load_ms = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # The nodes a retrieval would hydrate after the vector search.
+    node_ids = list(index_store.index_structs()[0].nodes_dict.values())
+    sample = random.Random(seed).sample(node_ids, min(k, len(node_ids)))
+    start = time.perf_counter()
+    docstore.get_nodes(sample)
+    fetch_ms = (time.perf_counter() - start) * 1000
+    return load_ms, fetch_ms, peak / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Startup time of the JSON docstore against the binary docstore"
+    )
+    parser.add_argument("store_path", nargs="?", default="travel_guide_store")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.store_path, DOCSTORE_FNAME)):
+        print(f"{DOCSTORE_FNAME} not found, run: python -m ai_assistant.docstores {args.store_path}")
+        return
+
+    print(f"{'docstore':>10} {'load ms':>10} {'fetch ms':>10} {'load MB':>10}")
+    for backend in ("json", "binary"):
+        runs = [measure(args.store_path, backend, args.k, seed) for seed in range(args.repeat)]
+        load_ms, fetch_ms, memory = (statistics.median(column) for column in zip(*runs))
+        print(f"{backend:>10} {load_ms:>10.2f} {fetch_ms:>10.3f} {memory:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Modules that must only be loaded on first use or by the warm-up task.
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "openai",
+    "llama_index.llms.openai",
+    "llama_index.embeddings.huggingface",
+    "gradio",
+]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> dict:
+    # A fresh interpreter per run, so nothing is already in sys.modules.
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list[tuple[float, str]]:
+    stderr = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:") :].split("|"))
+        if "." not in name.strip():
+            timings.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time budget for the API module")
+    parser.add_argument("--module", default="ai_assistant.api")
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    seconds = [run["seconds"] for run in runs]
+    heavy = sorted({module for run in runs for module in run["heavy"]})
+    median = statistics.median(seconds)
+    print(
+        f"import {args.module}: median {median:.2f}s, "
+        f"min {min(seconds):.2f}s, max {max(seconds):.2f}s (budget {args.budget:.2f}s)"
+    )
+    print("slowest packages:")
+    for cumulative, name in slowest_imports(args.module, args.top):
+        print(f"  {cumulative:6.2f}s  {name}")
+
+    failures = []
+    if median > args.budget:
+        failures.append(f"median import time {median:.2f}s exceeds {args.budget:.2f}s")
+    if heavy:
+        failures.append(f"heavy modules imported eagerly: {', '.join(heavy)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
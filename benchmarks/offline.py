@@ -0,0 +1,404 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import itertools
+import shutil
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Callable
+import numpy as np
+from benchmarks.standins import CITIES, write_guide, write_log
+
+SCENARIOS = ["api", "summary", "writes"]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+KEY_FIELDS = ("scenario", "name", "format", "log_size", "concurrency")
+
+Request = tuple[str, str, dict]
+
+
+def recommendation_request(subject: str) -> Callable[[int], Request]:
+    def build(index: int) -> Request:
+        params = {"city": CITIES[index % len(CITIES)], "notes": [f"nota {index}"]}
+        return "GET", f"/recommendations/{subject}", {"params": params}
+
+    return build
+
+
+def flight_request(index: int) -> Request:
+    params = {
+        "origin": CITIES[index % len(CITIES)],
+        "destination": CITIES[(index + 7) % len(CITIES)],
+        "travel_date": f"2025-{index % 12 + 1:02d}-{index % 28 + 1:02d}",
+    }
+    return "POST", "/reservations/flight", {"params": params}
+
+
+def batch_request(index: int, size: int = 10) -> Request:
+    reservations = []
+    for item in range(size):
+        city = CITIES[(index + item) % len(CITIES)]
+        day = f"2025-{item % 12 + 1:02d}-{item % 27 + 1:02d}"
+        if item % 3 == 0:
+            reservations.append(
+                {"type": "flight", "origin": "La Paz", "destination": city, "travel_date": day}
+            )
+        elif item % 3 == 1:
+            reservations.append(
+                {
+                    "type": "hotel",
+                    "start_date": day,
+                    "end_date": f"2025-{item % 12 + 1:02d}-{item % 27 + 2:02d}",
+                    "hotel": f"Hotel {index}",
+                    "city": city,
+                }
+            )
+        else:
+            reservations.append(
+                {
+                    "type": "restaurant",
+                    "reservation_date": day,
+                    "time": "20:00",
+                    "restaurant": f"Restaurante {index}",
+                    "city": city,
+                }
+            )
+    return "POST", "/reservations/batch", {"json": {"reservations": reservations}}
+
+
+# Shared by every report request of the run, so no trip id repeats across the
+# warm-up and the concurrency levels.
+_report_trips = itertools.count()
+
+
+def report_request(path: str) -> Callable[[int], Request]:
+    """Each request asks for the report of a new trip holding a copy of the API log.
+
+    The report is cached per trip and log version, so repeating one trip would
+    measure TripReportCache hits instead of report generation.
+    """
+
+    def build(index: int) -> Request:
+        from ai_assistant.trips import trip_log_file
+
+        trip_id = f"bench-{next(_report_trips)}"
+        log_path = trip_log_file(trip_id)
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        shutil.copyfile(os.environ["LOG_FILE"], log_path)
+        return "GET", path, {"params": {"trip_id": trip_id}}
+
+    return build
+
+
+ENDPOINTS: dict[str, Callable[[int], Request]] = {
+    "cities": lambda index: (
+        "GET", "/recommendations/cities", {"params": {"notes": [f"nota {index}"]}}
+    ),
+    "places": recommendation_request("places"),
+    "hotels": recommendation_request("hotels"),
+    "activities": recommendation_request("activities"),
+    "report": report_request("/trip/report"),
+    "report_stream": report_request("/trip/report/stream"),
+    "reservations": lambda index: ("GET", "/trip/reservations", {}),
+    "flight": flight_request,
+    "batch": batch_request,
+}
+
+
+def latency_row(latencies: list[float], elapsed: float | None = None, **fields) -> dict:
+    """Percentiles in milliseconds; per_s is the throughput over elapsed (or the sum)."""
+    milliseconds = np.asarray(latencies) * 1000
+    elapsed = elapsed if elapsed is not None else float(np.sum(latencies))
+    row = {field: fields.get(field) for field in KEY_FIELDS}
+    row.update(
+        count=len(latencies),
+        errors=fields.get("errors", 0),
+        per_s=len(latencies) / elapsed if elapsed else 0.0,
+        mean_ms=float(milliseconds.mean()),
+        p50_ms=float(np.percentile(milliseconds, 50)),
+        p95_ms=float(np.percentile(milliseconds, 95)),
+        p99_ms=float(np.percentile(milliseconds, 99)),
+    )
+    return row
+
+
+def timed_call(fn: Callable, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def run_log(spec: dict) -> list[dict]:
+    """trip_summary latency and reservation writes against one synthetic log."""
+    from ai_assistant.tools import build_flight_reservation, trip_summary
+    from ai_assistant.utils import save_reservation
+
+    fields = {"format": spec["format"], "log_size": spec["log_size"]}
+    rows = []
+    if spec["summary"]:
+        # The first call reads the whole log, later ones reuse the cached fold.
+        cold = timed_call(trip_summary)
+        rows.append(latency_row([cold], scenario="trip_summary", name="cold", **fields))
+        warm = [timed_call(trip_summary) for _ in range(spec["repeat"])]
+        rows.append(latency_row(warm, scenario="trip_summary", name="warm", **fields))
+    if spec["writes"]:
+        writes, after_write = [], []
+        for index in range(spec["writes"]):
+            reservation = build_flight_reservation(
+                "2025-06-01", "La Paz", CITIES[index % len(CITIES)]
+            )
+            writes.append(timed_call(save_reservation, reservation))
+            if spec["summary"]:
+                after_write.append(timed_call(trip_summary))
+        rows.append(latency_row(writes, scenario="reservation_write", name="save", **fields))
+        if after_write:
+            rows.append(
+                latency_row(after_write, scenario="trip_summary", name="after_write", **fields)
+            )
+    return rows
+
+
+async def drive(client, build: Callable[[int], Request], requests: int, concurrency: int):
+    """Sends requests from concurrency clients; returns latencies, errors and wall time."""
+    latencies: list[float] = []
+    errors = 0
+    indexes = iter(range(requests))
+
+    async def client_loop() -> None:
+        nonlocal errors
+        for index in indexes:
+            method, url, kwargs = build(index)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_api(spec: dict) -> list[dict]:
+    """Drives the FastAPI app in process, with the stand-in LLM and embeddings."""
+    from benchmarks.standins import install
+
+    install(spec["llm_latency"], spec["embed_dim"])
+    import httpx
+    from ai_assistant.api import app
+
+    rows = []
+    async with app.router.lifespan_context(app):
+        # The travel guide is ingested (with the stand-in embeddings) during warm-up.
+        while not (status := app.state.warmup.status()).ready:
+            if status.error:
+                raise RuntimeError(f"warm-up failed: {status.error}")
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=None
+        ) as client:
+            for endpoint in spec["endpoints"]:
+                build = ENDPOINTS[endpoint]
+                await drive(client, build, 1, 1)
+                for concurrency in spec["concurrency"]:
+                    latencies, errors, elapsed = await drive(
+                        client, build, spec["requests"], concurrency
+                    )
+                    rows.append(
+                        latency_row(
+                            latencies,
+                            elapsed,
+                            scenario="api",
+                            name=endpoint,
+                            format=spec["format"],
+                            log_size=spec["log_size"],
+                            concurrency=concurrency,
+                            errors=errors,
+                        )
+                    )
+    return rows
+
+
+def run_worker(scenario: str, spec: dict, env: dict[str, str]) -> list[dict]:
+    """Runs a scenario in a fresh interpreter, configured through env."""
+    with tempfile.NamedTemporaryFile(suffix=".json") as result:
+        process = subprocess.run(
+            [
+                sys.executable, "-W", "ignore", "-m", "benchmarks.offline",
+                "--worker", scenario, json.dumps(spec), result.name,
+            ],
+            env={**os.environ, **env},
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            sys.exit(f"{scenario} worker failed:\n{process.stderr[-4000:]}")
+        with open(result.name) as file:
+            return json.load(file)
+
+
+def print_rows(rows: list[dict]) -> None:
+    print(
+        f"{'scenario':<18} {'name':<12} {'format':>6} {'log size':>9} {'conc':>4} "
+        f"{'count':>6} {'errors':>6} {'per s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for row in rows:
+        concurrency = row["concurrency"] if row["concurrency"] is not None else "-"
+        print(
+            f"{row['scenario']:<18} {row['name']:<12} {row['format']:>6} {row['log_size']:>9} "
+            f"{concurrency:>4} {row['count']:>6} {row['errors']:>6} {row['per_s']:>9.1f} "
+            f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+        )
+
+
+def compare(rows: list[dict], baseline_path: str, threshold: float) -> list[str]:
+    """Rows whose p95 grew, or whose throughput fell, by more than threshold times."""
+    with open(baseline_path) as file:
+        baseline = {
+            tuple(row[field] for field in KEY_FIELDS): row for row in json.load(file)["results"]
+        }
+    regressions = []
+    print(f"\ncompared with {baseline_path}:")
+    for row in rows:
+        key = tuple(row[field] for field in KEY_FIELDS)
+        if key not in baseline or row["count"] < 2:
+            continue
+        before = baseline[key]
+        p95_ratio = row["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1.0
+        per_s_ratio = row["per_s"] / before["per_s"] if before["per_s"] else 1.0
+        label = " ".join(str(value) for value in key if value is not None)
+        print(f"  {label:<50} p95 x{p95_ratio:.2f}  per s x{per_s_ratio:.2f}")
+        if p95_ratio > threshold or per_s_ratio < 1 / threshold:
+            regressions.append(label)
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="API, trip_summary and reservation write benchmarks with local stand-ins "
+        "for the LLM and the embedding model"
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument(
+        "--log-sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--formats", nargs="+", choices=["jsonl", "json"], default=["jsonl", "json"])
+    parser.add_argument("--repeat", type=int, default=50, help="warm trip_summary calls")
+    parser.add_argument("--writes", type=int, default=20, help="reservations saved per log")
+    parser.add_argument(
+        "--endpoints",
+        nargs="+",
+        choices=list(ENDPOINTS),
+        default=["places", "hotels", "report", "flight", "batch"],
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint and concurrency")
+    parser.add_argument("--api-log-size", type=int, default=1_000)
+    parser.add_argument("--api-log-format", choices=["jsonl", "json"], default="jsonl")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per LLM call")
+    parser.add_argument("--embed-dim", type=int, default=256)
+    parser.add_argument("--guide-paragraphs", type=int, default=12, help="per city")
+    parser.add_argument("--response-cache", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="results file of a previous run")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--worker", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        scenario, spec, result_path = args.worker
+        spec = json.loads(spec)
+        rows = asyncio.run(run_api(spec)) if scenario == "api" else run_log(spec)
+        with open(result_path, "w") as file:
+            json.dump(rows, file)
+        return
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        base_env = {"AGENT_VERBOSE": "false", "RESERVATION_BACKEND": "file"}
+        if "summary" in args.scenarios or "writes" in args.scenarios:
+            for log_format in args.formats:
+                for log_size in args.log_sizes:
+                    log_path = os.path.join(workdir, f"trip-{log_size}.{log_format}")
+                    write_log(log_path, log_size, log_format, args.seed)
+                    spec = {
+                        "format": log_format,
+                        "log_size": log_size,
+                        "summary": "summary" in args.scenarios,
+                        "writes": args.writes if "writes" in args.scenarios else 0,
+                        "repeat": args.repeat,
+                    }
+                    env = {**base_env, "LOG_FILE": log_path, "LOG_FORMAT": log_format}
+                    rows.extend(run_worker("log", spec, env))
+                    os.remove(log_path)
+        if "api" in args.scenarios:
+            data_dir = os.path.join(workdir, "guide")
+            write_guide(data_dir, args.guide_paragraphs, args.seed)
+            log_path = os.path.join(workdir, f"trip-api.{args.api_log_format}")
+            write_log(log_path, args.api_log_size, args.api_log_format, args.seed)
+            spec = {
+                "endpoints": args.endpoints,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "llm_latency": args.llm_latency,
+                "embed_dim": args.embed_dim,
+                "format": args.api_log_format,
+                "log_size": args.api_log_size,
+            }
+            env = {
+                **base_env,
+                "LOG_FILE": log_path,
+                "LOG_FORMAT": args.api_log_format,
+                "TRAVEL_GUIDE_STORE_PATH": os.path.join(workdir, "store"),
+                "TRAVEL_GUIDE_DATA_PATH": data_dir,
+                "TRIP_LOGS_DIR": os.path.join(workdir, "trips"),
+                "RESPONSE_CACHE_ENABLED": str(args.response_cache).lower(),
+            }
+            rows.extend(run_worker("api", spec, env))
+
+    print_rows(rows)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"offline-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(
+            {
+                "meta": {
+                    "timestamp": datetime.now().isoformat(),
+                    "commit": git_commit(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "args": {key: value for key, value in vars(args).items() if key != "worker"},
+                },
+                "results": rows,
+            },
+            file,
+            indent=2,
+        )
+    print(f"saved {output}")
+
+    if args.compare:
+        regressions = compare(rows, args.compare, args.threshold)
+        for label in regressions:
+            print(f"REGRESSION: {label}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
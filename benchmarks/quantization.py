@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from ai_assistant.quantization import CODES_FNAMES, SCALES_FNAME, QuantizedMatrix
+from ai_assistant.vector_stores import (
+    MATRIX_FNAME,
+    MemmapVectorStore,
+    write_matrix_store,
+)
+from benchmarks.ann_recall import sample_queries, synthetic_matrix
+
+MODES = ["none", "int8"]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_queries(store_dir: str, mode: str, rerank_factor: int, k: int) -> dict:
+    """Runs in a fresh interpreter so the RSS only reflects this mode."""
+    queries = np.load(os.path.join(store_dir, "queries.npy"))
+    before = rss_mb()
+    store = MemmapVectorStore.from_persist_dir(
+        store_dir, quantization=mode, rerank_factor=rerank_factor
+    )
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        result = store.query(
+            VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k)
+        )
+        results.append([result.ids, result.similarities])
+    elapsed = time.perf_counter() - start
+    return {
+        "rss_mb": rss_mb() - before,
+        "ms_per_query": elapsed * 1000 / len(queries),
+        "results": results,
+    }
+
+
+def disk_mb(store_dir: str, mode: str) -> float:
+    fnames = [MATRIX_FNAME]
+    if mode != "none":
+        fnames.extend([CODES_FNAMES[mode], SCALES_FNAME])
+    return sum(os.path.getsize(os.path.join(store_dir, fname)) for fname in fnames) / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Memory and accuracy of quantized embeddings against float32"
+    )
+    parser.add_argument("--store", help="memmap store to benchmark instead of synthetic data")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--rerank-factor", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        store_dir, mode, rerank_factor = args.worker
+        print(json.dumps(run_queries(store_dir, mode, int(rerank_factor), args.k)))
+        return
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        if args.store:
+            matrix = np.asarray(MemmapVectorStore.from_persist_dir(args.store)._full_matrix())
+        else:
+            matrix = synthetic_matrix(args.rows, args.dim, args.clusters, args.seed)
+        write_matrix_store(store_dir, [str(row) for row in range(len(matrix))], matrix)
+        queries = sample_queries(matrix, min(args.queries, len(matrix)), args.seed)
+        np.save(os.path.join(store_dir, "queries.npy"), queries)
+        del matrix
+        # Write the codes up front so the workers only measure querying.
+        store = MemmapVectorStore.from_persist_dir(store_dir)
+        for mode in MODES[1:]:
+            QuantizedMatrix.write(store_dir, mode, store._full_matrix())
+
+        def measure(mode: str, rerank_factor: int) -> dict:
+            output = subprocess.run(
+                [
+                    sys.executable, "-W", "ignore", "-m", "benchmarks.quantization",
+                    "-k", str(args.k), "--worker", store_dir, mode, str(rerank_factor),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            return json.loads(output.strip().splitlines()[-1])
+
+        exact = measure("none", 1)
+        print(f"{len(store)} rows x {store._dim} dims, {len(queries)} queries, k={args.k}")
+        print(
+            f"{'mode':>8} {'rerank':>6} {'disk MB':>8} {'RSS MB':>8} {'ms/query':>9} "
+            f"{'recall@' + str(args.k):>9} {'max |dsim|':>10}"
+        )
+        print(
+            f"{'float32':>8} {'-':>6} {disk_mb(store_dir, 'none'):>8.1f} "
+            f"{exact['rss_mb']:>8.1f} {exact['ms_per_query']:>9.3f} {1.0:>9.3f} {0.0:>10.5f}"
+        )
+        for mode in MODES[1:]:
+            for rerank_factor in args.rerank_factor:
+                run = measure(mode, rerank_factor)
+                recalls, deltas = [], []
+                for (truth_ids, truth_sims), (ids, sims) in zip(exact["results"], run["results"]):
+                    recalls.append(len(set(truth_ids) & set(ids)) / len(truth_ids))
+                    # Similarity of the i-th result against the exact i-th result.
+                    deltas.extend(abs(a - b) for a, b in zip(truth_sims, sims))
+                print(
+                    f"{mode:>8} {rerank_factor:>6} {disk_mb(store_dir, mode):>8.1f} "
+                    f"{run['rss_mb']:>8.1f} {run['ms_per_query']:>9.3f} "
+                    f"{np.mean(recalls):>9.3f} {max(deltas):>10.5f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
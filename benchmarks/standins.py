@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import Any, Iterator, Sequence
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from ai_assistant.bm25 import tokenize
+from ai_assistant.regions import CITIES_BY_DEPARTMENT, DEPARTMENT_BY_CITY
+
+ANSWER_CHARS = 300
+REPORT_WORDS = ("report", "reporte", "summary", "resumen")
+
+CITIES = [city for cities in CITIES_BY_DEPARTMENT.values() for city in cities]
+
+
+class HashEmbedding(BaseEmbedding):
+    """Deterministic bag-of-words embedding: every token is hashed to a signed dimension.
+
+    Texts sharing words get similar vectors, so retrieval over the synthetic
+    guide behaves like a (weak) real model, at no cost and with no download.
+    """
+
+    dim: int = 256
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+class StandInLLM(CustomLLM):
+    """Scripted ReAct LLM: calls one tool, then answers with its observation.
+
+    Report requests call trip_summary and everything else calls travel_guide.
+    Prompts without the ReAct format (the travel guide's answer synthesis) get
+    a guide paragraph of their context back. Every call waits latency seconds, to
+    stand in for the API round trip.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            model_name="stand-in", is_chat_model=True, context_window=128_000, num_output=512
+        )
+
+    def respond(self, messages: Sequence[ChatMessage]) -> str:
+        if not any("Action Input" in (message.content or "") for message in messages):
+            # Answer synthesis: quote the first guide paragraph of the context.
+            lines = (messages[-1].content or "").splitlines()
+            quoted = next((line for line in lines if ", en el departamento de" in line), "")
+            return f"Según la guía: {quoted[:ANSWER_CHARS]}"
+        observations = []
+        task = ""
+        for message in messages:
+            content = message.content or ""
+            if message.role != MessageRole.USER:
+                continue
+            if content.startswith("Observation:"):
+                observations.append(content[len("Observation:") :].strip())
+            else:
+                task = content
+        if observations:
+            return (
+                "Thought: I can answer without using any more tools.\n"
+                f"Answer: {observations[-1][:ANSWER_CHARS]}"
+            )
+        if any(word in task.lower() for word in REPORT_WORDS):
+            return "Thought: I need the trip log.\nAction: trip_summary\nAction Input: {}"
+        return (
+            "Thought: I need to use a tool to help me answer the question.\n"
+            "Action: travel_guide\n"
+            f"Action Input: {json.dumps({'input': task}, ensure_ascii=False)}"
+        )
+
+    @staticmethod
+    def _chat_response(text: str) -> ChatResponse:
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=text))
+
+    @staticmethod
+    def _stream(text: str) -> Iterator[ChatResponse]:
+        content = ""
+        for word in text.split(" "):
+            delta = word if not content else f" {word}"
+            content += delta
+            yield ChatResponse(
+                message=ChatMessage(role=MessageRole.ASSISTANT, content=content), delta=delta
+            )
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        time.sleep(self.latency)
+        return self._chat_response(self.respond(messages))
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        await asyncio.sleep(self.latency)
+        return self._chat_response(self.respond(messages))
+
+    @llm_chat_callback()
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        time.sleep(self.latency)
+        return self._stream(self.respond(messages))
+
+    @llm_chat_callback()
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        text = self.respond(messages)
+
+        async def gen():
+            for response in self._stream(text):
+                yield response
+
+        return gen()
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.latency)
+        return CompletionResponse(text=self.respond([ChatMessage(content=prompt)]))
+
+    @llm_completion_callback()
+    async def acomplete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        await asyncio.sleep(self.latency)
+        return CompletionResponse(text=self.respond([ChatMessage(content=prompt)]))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        time.sleep(self.latency)
+        text = self.respond([ChatMessage(content=prompt)])
+
+        def gen():
+            for response in self._stream(text):
+                yield CompletionResponse(text=response.message.content, delta=response.delta)
+
+        return gen()
+
+
+def install(llm_latency: float = 0.0, embed_dim: int = 256) -> None:
+    """Makes get_llm and get_embed_model return the stand-ins.
+
+    Must run before anything calls them, so OpenAI and the Hugging Face model
+    are never loaded.
+    """
+    from ai_assistant import rags
+    from ai_assistant.embeddings import CachedEmbedding
+
+    rags._llm = StandInLLM(latency=llm_latency)
+    rags._embed_model = CachedEmbedding(
+        HashEmbedding(model_name="hash", dim=embed_dim),
+        max_size=rags.SETTINGS.embedding_cache_size,
+    )
+    Settings.llm = rags._llm
+    Settings.embed_model = rags._embed_model
+
+
+GUIDE_TOPICS = {
+    "hotel": ["hostal", "hotel boutique", "alojamiento familiar", "hotel con vista", "albergue"],
+    "restaurante": ["salteñas", "api con pastel", "trucha", "silpancho", "majadito", "pique macho"],
+    "actividad": ["caminata", "museo", "mercado", "mirador", "tour en bicicleta", "iglesia colonial"],
+}
+
+
+def write_guide(data_dir: str, paragraphs_per_city: int = 12, seed: int = 0) -> int:
+    """A synthetic travel guide, one file per department; returns the number of paragraphs."""
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    written = 0
+    for department, cities in CITIES_BY_DEPARTMENT.items():
+        paragraphs = []
+        for city in cities:
+            for _ in range(paragraphs_per_city):
+                topic = rng.choice(list(GUIDE_TOPICS))
+                options = rng.sample(GUIDE_TOPICS[topic], 3)
+                paragraphs.append(
+                    f"{city}, en el departamento de {department}. Para {topic} se recomienda "
+                    f"{options[0]}, {options[1]} y {options[2]}. Los viajeros destacan "
+                    f"{rng.choice(options)} cerca de la plaza principal de {city}, a "
+                    f"{rng.randint(2, 40)} minutos del centro, por {rng.randint(20, 400)} bolivianos."
+                )
+        path = os.path.join(data_dir, f"{department.lower().replace(' ', '_')}.txt")
+        with open(path, "w") as file:
+            file.write("\n\n".join(paragraphs))
+        written += len(paragraphs)
+    return written
+
+
+def synthetic_reservations(count: int, seed: int = 0) -> Iterator[dict]:
+    """Trip log records in the format save_reservations writes."""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    for _ in range(count):
+        day = start + timedelta(days=rng.randint(0, 365))
+        city = rng.choice(CITIES)
+        kind = rng.random()
+        if kind < 0.4:
+            destination = rng.choice(CITIES)
+            flight = DEPARTMENT_BY_CITY[city] != DEPARTMENT_BY_CITY[destination]
+            yield {
+                "trip_type": "FLIGHT" if flight else "BUS",
+                "date": day.isoformat(),
+                "departure": city,
+                "destination": destination,
+                "cost": rng.randint(200, 700) if flight else rng.randint(50, 200),
+                "reservation_type": "TripReservation",
+            }
+        elif kind < 0.7:
+            yield {
+                "checkin_date": day.isoformat(),
+                "checkout_date": (day + timedelta(days=rng.randint(1, 5))).isoformat(),
+                "hotel_name": f"Hotel {rng.choice(GUIDE_TOPICS['hotel']).title()} {city}",
+                "city": city,
+                "cost": rng.randint(100, 1000),
+                "reservation_type": "HotelReservation",
+            }
+        else:
+            yield {
+                "reservation_time": datetime.combine(
+                    day, datetime.min.time().replace(hour=rng.randint(11, 22))
+                ).isoformat(),
+                "restaurant": f"Restaurante {rng.choice(GUIDE_TOPICS['restaurante']).title()}",
+                "city": city,
+                "dish": rng.choice(GUIDE_TOPICS["restaurante"]),
+                "cost": rng.randint(20, 100),
+                "reservation_type": "RestaurantReservation",
+            }
+
+
+def write_log(path: str, count: int, log_format: str = "jsonl", seed: int = 0) -> None:
+    """Writes a trip log of count records, streaming so 1M entries fit in memory."""
+    with open(path, "w") as file:
+        if log_format == "jsonl":
+            for record in synthetic_reservations(count, seed):
+                file.write(json.dumps(record) + "\n")
+            return
+        file.write("[")
+        for index, record in enumerate(synthetic_reservations(count, seed)):
+            file.write(",\n    " if index else "\n    ")
+            file.write(json.dumps(record))
+        file.write("\n]")
@@ -0,0 +1,58 @@
+import json
+from multiprocessing import Pool
+from ai_assistant.journal import append_lines, iter_records, migrate_array_log
+
+
+def test_torn_last_line_is_dropped_on_next_append(tmp_path):
+    log = tmp_path / "trip.jsonl"
+    log.write_text('{"n": 1}\n{"n": 2}\n{"n": ')
+
+    assert list(iter_records(str(log))) == [{"n": 1}, {"n": 2}]
+    append_lines(str(log), [json.dumps({"n": 3})])
+    assert log.read_text() == '{"n": 1}\n{"n": 2}\n{"n": 3}\n'
+
+
+def test_torn_only_line_is_dropped(tmp_path):
+    log = tmp_path / "trip.jsonl"
+    log.write_text('{"n": ')
+
+    append_lines(str(log), [json.dumps({"n": 1})])
+    assert list(iter_records(str(log))) == [{"n": 1}]
+
+
+def test_migrate_array_log(tmp_path):
+    log = tmp_path / "trip.json"
+    records = [{"n": 1}, {"n": 2, "city": "Sucre"}]
+    log.write_text(json.dumps(records, indent=4))
+
+    assert migrate_array_log(str(log)) == 2
+    assert log.read_text() == "".join(json.dumps(record) + "\n" for record in records)
+    assert list(iter_records(str(log))) == records
+    # Already a journal: nothing left to migrate.
+    assert migrate_array_log(str(log)) == 0
+
+
+def test_append_migrates_array_log(tmp_path):
+    log = tmp_path / "trip.json"
+    log.write_text(json.dumps([{"n": 1}]))
+
+    append_lines(str(log), [json.dumps({"n": 2})])
+    assert list(iter_records(str(log))) == [{"n": 1}, {"n": 2}]
+
+
+def _append_many(args: tuple[str, int]) -> None:
+    log, writer = args
+    for index in range(50):
+        append_lines(log, [json.dumps({"writer": writer, "n": index})] * 3, fsync="never")
+
+
+def test_concurrent_appends_keep_every_line(tmp_path):
+    log = str(tmp_path / "trip.jsonl")
+    with Pool(4) as pool:
+        pool.map(_append_many, [(log, writer) for writer in range(4)])
+
+    records = list(iter_records(log))
+    assert len(records) == 4 * 50 * 3
+    for writer in range(4):
+        indexes = [record["n"] for record in records if record["writer"] == writer]
+        assert indexes == sorted(indexes)
@@ -0,0 +1,71 @@
+import os
+from datetime import date
+import pytest
+from ai_assistant import trips, utils
+from ai_assistant.models import HotelReservation, TripReservation, TripType
+from ai_assistant.summary import summarize_log
+from ai_assistant.trips import check_trip_id, trip_log_file, trip_scope
+from ai_assistant.utils import save_reservation
+
+
+@pytest.fixture
+def trip_logs(tmp_path, monkeypatch):
+    # Every module reads its own settings object at import time.
+    for module in (trips, utils):
+        monkeypatch.setattr(module.SETTINGS, "trip_logs_dir", str(tmp_path / "trips"))
+        monkeypatch.setattr(module.SETTINGS, "log_file", str(tmp_path / "trip.jsonl"))
+        monkeypatch.setattr(module.SETTINGS, "log_format", "jsonl")
+        monkeypatch.setattr(module.SETTINGS, "reservation_backend", "file")
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "trip_id", ["../x", "..", "a/b", "/etc/passwd", "a.b", "a b", "", "x" * 65]
+)
+def test_invalid_trip_ids_are_rejected(trip_id):
+    with pytest.raises(ValueError):
+        check_trip_id(trip_id)
+    with pytest.raises(ValueError):
+        with trip_scope(trip_id):
+            pass
+
+
+@pytest.mark.parametrize("trip_id", ["ana-2024", "Trip_1", "x" * 64])
+def test_valid_trip_ids(trip_id):
+    assert check_trip_id(trip_id) == trip_id
+
+
+def test_trips_write_separate_logs_and_summaries(trip_logs):
+    with trip_scope("ana"):
+        save_reservation(
+            HotelReservation(
+                checkin_date=date(2025, 3, 1),
+                checkout_date=date(2025, 3, 3),
+                hotel_name="Hotel Sucre",
+                city="Sucre",
+                cost=300,
+            )
+        )
+    with trip_scope("bob"):
+        save_reservation(
+            TripReservation(
+                trip_type=TripType.flight,
+                date=date(2025, 4, 1),
+                departure="La Paz",
+                destination="Uyuni",
+                cost=500,
+            )
+        )
+
+    ana_log, bob_log = trip_log_file("ana"), trip_log_file("bob")
+    assert os.path.dirname(ana_log) == os.path.dirname(bob_log) == str(trip_logs / "trips")
+    assert ana_log != bob_log
+    # Nothing went to the shared log.
+    assert not os.path.exists(trip_logs / "trip.jsonl")
+
+    ana = summarize_log(ana_log)
+    bob = summarize_log(bob_log)
+    assert ana.total_budget == 300
+    assert list(ana.activities_by_place) == ["Sucre"]
+    assert bob.total_budget == 500
+    assert list(bob.activities_by_place) == ["La Paz to Uyuni"]